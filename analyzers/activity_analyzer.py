@@ -0,0 +1,100 @@
+import time
+import pandas as pd
+from processors.csv_meta import PANDAS_LINE_TERMINATOR, write_columns
+from processors.detail_parser import format_cents
+from analyzers.transactions import load_transactions, analyze_in_chunks
+from analyzers.aggregate_state import AggregateState, AggregateChunks
+
+# 汇总结果的列（总金额为整数分），也是增量汇总状态保存的内容
+SUMMARY_COLUMNS = ['对方微信名', '粒度', '时段', '交易数', '总金额']
+
+# 时间粒度：(粒度列的值, numpy时间单位, 时段的显示格式)，时段格式补零，按文本排序即按时间排序
+GRANULARITIES = [
+    ('日', 'D', '%Y-%m-%d'),
+    ('时', 'h', '%Y-%m-%d %H:00'),
+]
+
+
+class ActivityState(AggregateState):
+    """交易时段的汇总状态：按(对方微信名, 粒度, 时段)保存交易数和总金额（整数分）"""
+    FILE_NAME = 'activity_state.db'
+    TABLE = '交易时段'
+    KEY_COLUMNS = SUMMARY_COLUMNS[:3]
+    SUM_COLUMNS = SUMMARY_COLUMNS[3:]
+
+
+def analyze(input_file, output_file, chunk_rows=None):
+    """交易时段分析：每个对方微信名按日、按小时的交易数和金额，chunk_rows不为空时分块读取流水总表"""
+    try:
+        if chunk_rows:
+            analyze_in_chunks(analyze_chunks(output_file), input_file, chunk_rows)
+            return True
+        return analyze_frame(load_transactions(input_file), output_file)
+    except Exception as e:
+        print(f"交易时段分析失败: {str(e)}")
+        return False
+
+
+def analyze_chunks(output_file, state=None):
+    """分块模式：各块的时段汇总合并进state（为None时使用临时状态），close()时输出交易时段表"""
+    return AggregateChunks(aggregate, write_summary, output_file, state, ActivityState)
+
+
+def analyze_frame(transactions, output_file, state=None):
+    """基于共享的流水总表解析结果生成交易时段表
+
+    state为ActivityState时，本批交易的汇总先合并进已保存的汇总状态，输出合并后的全部时段。
+    """
+    try:
+        start = time.time()
+        summary = aggregate(transactions)
+        if state is not None:
+            summary = state.merge(summary)
+        write_summary(summary, output_file)
+        print(f"交易时段分析完成：{len(transactions)} 条记录，{len(summary)} 个时段，"
+              f"耗时 {time.time() - start:.2f} 秒")
+        return True
+    except Exception as e:
+        print(f"交易时段分析失败: {str(e)}")
+        return False
+
+
+def aggregate(transactions):
+    """按(对方微信名, 粒度, 时段)汇总交易数和金额，返回SUMMARY_COLUMNS各列（按前三列排序）
+
+    时间截断到日/小时后整体分组（只输出有交易的时段），时间无法解析的记录不计入。
+    """
+    valid = transactions.times.notna().to_numpy()
+    if not valid.all():
+        print(f"交易时段分析：{(~valid).sum()} 条记录的时间无法解析，已跳过")
+    stamps = transactions.times.to_numpy()[valid]
+    df = pd.DataFrame({
+        '对方微信名': transactions.counterparts[valid],
+        '金额': transactions.cents[valid],
+    })
+
+    parts = []
+    for label, unit, time_format in GRANULARITIES:
+        df['时段'] = stamps.astype(f'datetime64[{unit}]')
+        part = df.groupby(['对方微信名', '时段']).agg(
+            交易数=('金额', 'size'),
+            总金额=('金额', 'sum')
+        ).reset_index()
+        part['时段'] = part['时段'].dt.strftime(time_format)
+        part['粒度'] = label
+        parts.append(part)
+
+    summary = pd.concat(parts, ignore_index=True)[SUMMARY_COLUMNS]
+    return summary.sort_values(SUMMARY_COLUMNS[:3], kind='stable', ignore_index=True)
+
+
+def write_summary(summary, output_file):
+    """输出交易时段表，总金额由整数分转换为元（格式同交易总额表）"""
+    columns = [summary[column].astype(str).tolist() for column in SUMMARY_COLUMNS[:4]]
+    columns.append([format_cents(cents) for cents in summary['总金额'].tolist()])
+    write_columns(output_file, SUMMARY_COLUMNS, columns, PANDAS_LINE_TERMINATOR)
+
+
+if __name__ == "__main__":
+    # 测试代码
+    analyze("流水总表.csv", "test_activity.csv")
@@ -0,0 +1,111 @@
+import sqlite3
+import pandas as pd
+
+
+class AggregateState:
+    """持久化的可合并汇总状态：按KEY_COLUMNS分组保存SUM_COLUMNS各项的累计值（均为整数，可直接相加）
+
+    增量导入时只需把新增交易的汇总合并进来（只更新涉及的分组），时间与本批分组的数量成正比。
+    与IngestIndex一样，整个任务（含数据库导入）成功后调用commit()才写入，失败时直接close()即可。
+    子类给出FILE_NAME（状态文件名，放在报告的数据库目录下）、TABLE、KEY_COLUMNS和SUM_COLUMNS。
+
+    用法：
+        state = AmountState(state_path)
+        try:
+            state.reset()                  # 全量处理时重新建立汇总
+            summary = state.merge(batch)   # 返回合并后的全部分组
+            ...
+            state.commit()
+        finally:
+            state.close()
+    """
+
+    FILE_NAME = None
+    TABLE = None
+    KEY_COLUMNS = []
+    SUM_COLUMNS = []
+
+    def __init__(self, state_path):
+        self.columns = self.KEY_COLUMNS + self.SUM_COLUMNS
+        self.keys = ', '.join(f'"{column}"' for column in self.KEY_COLUMNS)
+        self.conn = sqlite3.connect(state_path, timeout=30, check_same_thread=False)
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS "{self.TABLE}" (
+                {', '.join(f'"{column}" TEXT NOT NULL' for column in self.KEY_COLUMNS)},
+                {', '.join(f'"{column}" INTEGER NOT NULL' for column in self.SUM_COLUMNS)},
+                PRIMARY KEY ({self.keys})
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def reset(self):
+        """清空汇总（流水总表包含全部交易时调用）"""
+        self.conn.execute(f'DELETE FROM "{self.TABLE}"')
+
+    def add(self, summary):
+        """合并一批交易的汇总（含KEY_COLUMNS和SUM_COLUMNS列的DataFrame）"""
+        rows = zip(*(summary[column].tolist() for column in self.columns))
+        updates = ', '.join(f'"{column}" = "{column}" + excluded."{column}"' for column in self.SUM_COLUMNS)
+        self.conn.executemany(f'''
+            INSERT INTO "{self.TABLE}" VALUES ({', '.join('?' * len(self.columns))})
+            ON CONFLICT ({self.keys}) DO UPDATE SET {updates}
+        ''', rows)
+
+    def merge(self, summary):
+        """合并一批交易的汇总，返回合并后的全部汇总"""
+        self.add(summary)
+        return self.summary()
+
+    def summary(self):
+        """全部分组的汇总（按KEY_COLUMNS排序，与groupby的顺序一致）"""
+        rows = self.conn.execute(f'SELECT * FROM "{self.TABLE}" ORDER BY {self.keys}').fetchall()
+        return pd.DataFrame(rows, columns=self.columns)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        # 未提交的合并随连接关闭丢弃
+        self.conn.close()
+
+
+class AggregateChunks:
+    """汇总类分析器的分块执行：每块的汇总合并进state，close()时按合并后的全部汇总输出
+
+    aggregate(transactions)返回一块的汇总，write(summary, output_file)输出功能表；
+    state为None时使用内存中的临时状态（内存与分组数成正比，与交易数无关）。
+    """
+
+    def __init__(self, aggregate, write, output_file, state, state_class):
+        self.aggregate = aggregate
+        self.write = write
+        self.output_file = output_file
+        self.own_state = state is None
+        self.state = state_class(':memory:') if state is None else state
+
+    def add(self, transactions):
+        self.state.add(self.aggregate(transactions))
+
+    def close(self):
+        self.write(self.state.summary(), self.output_file)
+        if self.own_state:
+            self.state.close()
+
+    def discard(self):
+        """出错时不输出功能表；state的未提交合并由其所有者关闭时丢弃"""
+        if self.own_state:
+            self.state.close()
+
+
+class StagedState:
+    """在工作进程中代替汇总状态：合并结果只用于输出功能表（连接关闭时丢弃），
+    合并过的各批汇总记在batches中，交回主进程合并进其状态，与数据库导入一同提交
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.batches = []
+
+    def merge(self, summary):
+        self.batches.append(summary)
+        return self.state.merge(summary)
@@ -1,109 +1,120 @@
+import numpy as np
 import pandas as pd
-import re
-from tqdm import tqdm
+from processors.csv_meta import write_row_count
+from processors.detail_parser import format_cents
+from analyzers.transactions import load_transactions, analyze_in_chunks, EMPTY_VALUE
+from analyzers.aggregate_state import AggregateState, AggregateChunks
 
+# 汇总结果的列（总金额为整数分），也是增量汇总状态保存的内容
+SUMMARY_COLUMNS = ['转账方', '收款方', '总金额', '总交易数', '微信红包个数']
 
-def analyze(input_file, output_file):
-    """交易总额分析（增强版）"""
+
+class AmountState(AggregateState):
+    """交易总额的汇总状态：按(转账方, 收款方)保存总金额（整数分）、交易数和微信红包个数"""
+    FILE_NAME = 'amount_state.db'
+    TABLE = '交易总额'
+    KEY_COLUMNS = SUMMARY_COLUMNS[:2]
+    SUM_COLUMNS = SUMMARY_COLUMNS[2:]
+
+
+def analyze(input_file, output_file, chunk_rows=None):
+    """交易总额分析（增强版），chunk_rows不为空时分块读取流水总表"""
     try:
-        df = pd.read_csv(input_file, encoding='utf-8-sig')
-
-        # 先填充原始数据中的空值
-        df = df.fillna('')
-
-        # 提取交易双方信息
-        df[['转账方', '收款方']] = df.apply(
-            lambda row: extract_parties(row['交易明细'], row['交易方式'], row['检材微信名'], row['对方微信名']),
-            axis=1,
-            result_type='expand'
-        )
-
-        # 提取金额
-        df['金额'] = df['交易明细'].apply(extract_amount)
-
-        # 统计总金额和交易次数
-        summary = df.groupby(['转账方', '收款方']).agg(
-            总金额=('金额', 'sum'),
-            总交易数=('金额', 'count')
-        ).reset_index()
-
-        # 统计微信红包个数
-        red_packet_counts = df[df['交易方式'] == '微信红包'].groupby(['转账方', '收款方']).size().reset_index(
-            name='微信红包个数')
-
-        # 合并结果
-        final_df = pd.merge(
-            summary,
-            red_packet_counts,
-            on=['转账方', '收款方'],
-            how='left'
-        )
-
-        # 处理微信红包个数
-        final_df['微信红包个数'] = final_df['微信红包个数'].fillna(0).astype(int)
-
-        # 调整列顺序
-        final_df = final_df[['转账方', '收款方', '总金额', '微信红包个数']]
-
-        # 再次检查并填充所有空值
-        for col in final_df.columns:
-            final_df[col] = final_df[col].apply(
-                lambda x: '<空缺>' if pd.isna(x) or (isinstance(x, str) and not x.strip()) else x
-            )
-
-        final_df.to_csv(output_file, index=False, encoding='utf-8-sig')
-        return True
+        if chunk_rows:
+            analyze_in_chunks(analyze_chunks(output_file), input_file, chunk_rows)
+            return True
+        return analyze_frame(load_transactions(input_file), output_file)
     except Exception as e:
         print(f"交易总额分析失败: {str(e)}")
         return False
 
 
-def extract_parties(detail, tx_type, default_payer, default_payee):
-    """从交易明细提取交易双方（增强版）"""
-    try:
-        # 确保默认值不为空
-        default_payer = str(default_payer).strip() if pd.notna(default_payer) and str(default_payer).strip() else '<空缺>'
-        default_payee = str(default_payee).strip() if pd.notna(default_payee) and str(default_payee).strip() else '<空缺>'
-
-        # 确保detail不为空
-        if pd.isna(detail) or not str(detail).strip():
-            return (default_payer, default_payee)
-
-        detail = str(detail)
+def analyze_chunks(output_file, state=None):
+    """分块模式：各块的交易对汇总合并进state（为None时使用临时状态），close()时输出交易总额表"""
+    return AggregateChunks(aggregate, write_summary, output_file, state, AmountState)
 
-        # 微信红包特殊处理
-        if pd.notna(tx_type) and "微信红包" in str(tx_type):
-            return (default_payee, default_payer)
 
-        # 普通转账处理
-        payer_match = re.search(r'^(.*?)\s+向', detail)
-        payee_match = re.search(r'向\s*([^转发送]+?)(?:转账|发送|$)', detail)
+def analyze_frame(transactions, output_file, state=None):
+    """基于共享的流水总表解析结果生成交易总额表
 
-        payer = payer_match.group(1).strip() if payer_match else default_payer
-        payee = payee_match.group(1).strip() if payee_match else default_payee
-
-        # 最终检查，确保不返回空字符串
-        payer = payer if payer else '<空缺>'
-        payee = payee if payee else '<空缺>'
-
-        return (payer, payee)
+    state为AmountState时，本批交易的汇总先合并进已保存的汇总状态（只更新涉及的交易对），
+    输出合并后的全部交易对；否则只输出本批交易的汇总。
+    """
+    try:
+        summary = aggregate(transactions)
+        if state is not None:
+            summary = state.merge(summary)
+        write_summary(summary, output_file)
+        return True
     except Exception as e:
-        return ('<空缺>', '<空缺>')
+        print(f"交易总额分析失败: {str(e)}")
+        return False
 
 
-def extract_amount(detail):
-    """精确提取金额（只匹配￥后的第一个金额）"""
-    try:
-        if pd.isna(detail):
-            return 0.0
-        # 匹配模式：￥开头，后接数字（允许小数点和逗号分隔）
-        match = re.search(r'￥([\d,]+\.?\d*|\d+\.?\d*)', str(detail).replace('，', ''))
-        if match:
-            # 清理逗号并转换为浮点数
-            return float(match.group(1).replace(',', ''))
-        return 0.0
-    except:
-        return 0.0
+def aggregate(transactions):
+    """按(转账方, 收款方)汇总，返回SUMMARY_COLUMNS各列（按交易对排序），汇总可直接相加合并"""
+    # 按列确定交易双方和金额
+    payer, payee, amount = extract_parties_and_amount(transactions)
+    df = pd.DataFrame({
+        '转账方': payer,
+        '收款方': payee,
+        '金额': amount,
+        '微信红包': (transactions.frame['交易方式'] == '微信红包').to_numpy(dtype=bool)
+    })
+
+    # 统计总金额、交易次数和微信红包个数（金额为int64整数分，累加无精度损失）
+    return df.groupby(['转账方', '收款方']).agg(
+        总金额=('金额', 'sum'),
+        总交易数=('金额', 'count'),
+        微信红包个数=('微信红包', 'sum')
+    ).reset_index()[SUMMARY_COLUMNS]
+
+
+def write_summary(summary, output_file):
+    """输出交易总额表，总金额由整数分转换为元（浮点数格式，与按浮点数汇总时的输出一致）"""
+    final_df = summary[['转账方', '收款方', '总金额', '微信红包个数']].copy()
+    final_df['总金额'] = [format_cents(cents) for cents in final_df['总金额'].tolist()]
+    final_df['微信红包个数'] = final_df['微信红包个数'].astype(int)
+
+    # 再次检查并填充所有空值（金额和个数列不会为空）
+    for col in ['转账方', '收款方']:
+        blank = final_df[col].isna() | (final_df[col].astype(object).map(str.strip, na_action='ignore') == '')
+        final_df.loc[blank, col] = EMPTY_VALUE
+
+    final_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    write_row_count(output_file, len(final_df))
+
+
+def extract_parties_and_amount(transactions):
+    """按列确定交易双方和金额（增强版），返回 (转账方, 收款方, 金额（整数分）) 三个数组
+
+    规则（按优先级）：
+        明细为空：使用默认交易方（检材微信名→对方微信名），金额为0
+        金额无法解析：交易双方照常确定，金额为0
+        微信红包：不从明细提取，默认交易方对调（对方微信名→检材微信名）
+        其他：使用明细中的转账方/收款方，未找到时使用默认值，为空时为<空缺>
+    """
+    details, payers, payees, amount_texts = (transactions.details, transactions.payers,
+                                             transactions.payees, transactions.amount_texts)
+    default_payers, default_payees = transactions.examiners, transactions.counterparts
+    red_packet = transactions.red_packet
+
+    # 只有三项都未找到的明细才可能为空
+    blank = pd.isna(payers) & pd.isna(payees) & (amount_texts == '')
+    candidates = np.flatnonzero(blank)
+    blank[candidates] = [not details[i].strip() for i in candidates]
+
+    payer = np.where(pd.isna(payers), default_payers, payers)
+    payee = np.where(pd.isna(payees), default_payees, payees)
+    payer[payer == ''] = EMPTY_VALUE
+    payee[payee == ''] = EMPTY_VALUE
+    payer = np.where(red_packet, default_payees, payer)
+    payee = np.where(red_packet, default_payers, payee)
+    payer = np.where(blank, default_payers, payer)
+    payee = np.where(blank, default_payees, payee)
+
+    # 明细为空或金额无法解析时整数分已为0
+    return payer, payee, transactions.cents
 
 
 if __name__ == "__main__":
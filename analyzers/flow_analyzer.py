@@ -0,0 +1,179 @@
+import time
+import numpy as np
+import pandas as pd
+from processors.csv_meta import PANDAS_LINE_TERMINATOR, write_columns
+from processors.detail_parser import format_cents
+from analyzers.transactions import load_transactions, analyze_in_chunks
+from analyzers.aggregate_state import AggregateChunks
+from analyzers.amount_analyzer import aggregate as aggregate_pairs, AmountState
+
+# 输出列：每个交易方一行，按总流量（转入+转出）从大到小排列，枢纽排名即行号
+HEADERS = ['枢纽排名', '交易方', '转入总额', '转出总额', '净流入', '转入笔数', '转出笔数',
+           '上家数', '下家数', '往返对象数']
+
+# 日志中列出的枢纽个数
+TOP_HUBS = 10
+
+
+class FlowGraph:
+    """资金流向图：交易方映射为整数编号，有向边（转账方→收款方）以CSR数组保存，同一交易对只有一条边
+
+    names    编号→交易方名称
+    indptr   转账方u的出边为 indptr[u]:indptr[u + 1]（按收款方编号升序）
+    indices  出边的收款方编号
+    cents    出边的总金额（int64整数分）
+    counts   出边的交易数
+    各项统计均为整体的数组运算，不构造逐个交易方的字典，可支持数百万条边。
+    """
+
+    def __init__(self, payers, payees, cents, counts=None):
+        edges = len(payers)
+        cents = np.asarray(cents, dtype=np.int64)
+        counts = np.ones(edges, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        codes, names = pd.factorize(np.concatenate([np.asarray(payers, dtype=object),
+                                                    np.asarray(payees, dtype=object)]))
+        self.names = np.asarray(names, dtype=object)
+        size = len(self.names)
+
+        # 以 转账方*交易方数+收款方 为边的键，排序后合并重复的交易对
+        keys = codes[:edges].astype(np.int64) * size + codes[edges:]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.diff(keys, prepend=-1) != 0)
+        self.keys = keys[starts]
+        self.cents = np.add.reduceat(cents[order], starts)
+        self.counts = np.add.reduceat(counts[order], starts)
+        self.sources = self.keys // max(size, 1)
+        self.indices = self.keys % max(size, 1)
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.sources, minlength=size), out=self.indptr[1:])
+
+    def __len__(self):
+        return len(self.names)
+
+    def successors(self, node):
+        """交易方node（编号）的收款方编号及对应的总金额"""
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.indices[start:end], self.cents[start:end]
+
+    def _sum(self, nodes, values):
+        totals = np.zeros(len(self), dtype=np.int64)
+        np.add.at(totals, nodes, values)
+        return totals
+
+    def out_totals(self):
+        """各交易方的转出总额（整数分）"""
+        return self._sum(self.sources, self.cents)
+
+    def in_totals(self):
+        """各交易方的转入总额（整数分）"""
+        return self._sum(self.indices, self.cents)
+
+    def out_counts(self):
+        return self._sum(self.sources, self.counts)
+
+    def in_counts(self):
+        return self._sum(self.indices, self.counts)
+
+    def out_degrees(self):
+        """各交易方的下家数（收款方个数）"""
+        return np.diff(self.indptr)
+
+    def in_degrees(self):
+        """各交易方的上家数（转账方个数）"""
+        return np.bincount(self.indices, minlength=len(self))
+
+    def net_flow(self):
+        """各交易方的净流入（转入-转出，整数分）"""
+        return self.in_totals() - self.out_totals()
+
+    def hub_order(self):
+        """全部交易方编号按总流量（转入+转出）从大到小排列，相同时按编号"""
+        return np.argsort(-(self.in_totals() + self.out_totals()), kind='stable')
+
+    def top_hubs(self, k):
+        """总流量最大的k个交易方编号"""
+        return self.hub_order()[:k]
+
+    def direct_cycles(self):
+        """往返转账（A→B且B→A，不含A→A），返回 (A编号, B编号, A→B总金额, B→A总金额)，每对只出现一次（A<B）"""
+        # 不计方向的交易对键；边不重复，因此键出现两次即两个方向都有边。
+        # 边按键（转账方优先）排列，稳定排序后同一交易对中转账方编号较小的边在前
+        low, high = np.minimum(self.sources, self.indices), np.maximum(self.sources, self.indices)
+        edges = np.flatnonzero(low != high)
+        pair_keys = low[edges] * len(self) + high[edges]
+        order = np.argsort(pair_keys, kind='stable')
+        first = np.flatnonzero(np.diff(pair_keys[order]) == 0)
+        forward, backward = edges[order[first]], edges[order[first + 1]]
+        return self.sources[forward], self.indices[forward], self.cents[forward], self.cents[backward]
+
+    def cycle_partners(self, cycles=None):
+        """各交易方的往返对象数（cycles为已计算的direct_cycles结果）"""
+        cycle_a, cycle_b, _, _ = cycles or self.direct_cycles()
+        return np.bincount(np.concatenate([cycle_a, cycle_b]), minlength=len(self))
+
+
+def analyze(input_file, output_file, chunk_rows=None):
+    """资金流向分析：各交易方的转入/转出总额、净流入和往返转账，chunk_rows不为空时分块读取流水总表"""
+    try:
+        if chunk_rows:
+            analyze_in_chunks(analyze_chunks(output_file), input_file, chunk_rows)
+            return True
+        return analyze_frame(load_transactions(input_file), output_file)
+    except Exception as e:
+        print(f"资金流向分析失败: {str(e)}")
+        return False
+
+
+def analyze_chunks(output_file):
+    """分块模式：各块的交易对汇总合并进临时状态，close()时建图并输出资金节点表"""
+    return AggregateChunks(aggregate_pairs, write_graph, output_file, None, AmountState)
+
+
+def analyze_frame(transactions, output_file):
+    """基于共享的流水总表解析结果生成资金节点表（边即交易总额表的交易对）"""
+    return analyze_summary(aggregate_pairs(transactions), output_file)
+
+
+def analyze_summary(pairs, output_file):
+    """由交易总额的交易对汇总（如AmountState.summary()，包含历史交易）生成资金节点表"""
+    try:
+        write_graph(pairs, output_file)
+        return True
+    except Exception as e:
+        print(f"资金流向分析失败: {str(e)}")
+        return False
+
+
+def write_graph(pairs, output_file):
+    """由交易对汇总（转账方、收款方、总金额、总交易数）建图并输出资金节点表"""
+    start = time.time()
+    graph = FlowGraph(pairs['转账方'].to_numpy(dtype=object), pairs['收款方'].to_numpy(dtype=object),
+                      pairs['总金额'].to_numpy(dtype=np.int64), pairs['总交易数'].to_numpy(dtype=np.int64))
+    cycles = graph.direct_cycles()
+    write_columns(output_file, HEADERS, node_columns(graph, cycles), PANDAS_LINE_TERMINATOR)
+
+    hubs = '、'.join(graph.names[graph.top_hubs(TOP_HUBS)])
+    print(f"资金流向分析完成：{len(graph)} 个交易方，{len(graph.keys)} 条边，"
+          f"{len(cycles[0])} 对往返转账，耗时 {time.time() - start:.2f} 秒")
+    print(f"资金枢纽（前{TOP_HUBS}）：{hubs}")
+
+
+def node_columns(graph, cycles=None):
+    """按总流量排序的各交易方统计，返回与HEADERS对应的字符串列表"""
+    in_totals, out_totals = graph.in_totals(), graph.out_totals()
+    order = graph.hub_order()
+    amounts = [in_totals, out_totals, in_totals - out_totals]
+    numbers = [graph.in_counts(), graph.out_counts(), graph.in_degrees(), graph.out_degrees(),
+               graph.cycle_partners(cycles)]
+    return [
+        [str(rank) for rank in range(1, len(graph) + 1)],
+        graph.names[order].tolist(),
+        *([format_cents(cents) for cents in column[order].tolist()] for column in amounts),
+        *(list(map(str, column[order].tolist())) for column in numbers),
+    ]
+
+
+if __name__ == "__main__":
+    # 测试代码
+    analyze("流水总表.csv", "test_flow.csv")
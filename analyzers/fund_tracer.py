@@ -0,0 +1,187 @@
+import sqlite3
+import time
+from contextlib import closing
+import numpy as np
+import pandas as pd
+from processors.columnar import TIME_FORMAT
+from processors.detail_parser import format_cents, amounts_to_cents
+from analyzers.transactions import Transactions
+from analyzers.transfer_analyzer import transfer_parties
+
+# 追踪的默认跳数和上限、默认返回的交易方个数
+DEFAULT_HOPS = 3
+MAX_HOPS = 6
+DEFAULT_LIMIT = 200
+
+# 从数据库加载索引时读取的表（包含全部历史交易，增量导入时也是完整的）和列
+TOTAL_TABLE = '总表'
+INDEX_COLUMNS = ['时间', '检材微信名', '对方微信名', '交易明细', '交易方式']
+
+# 复合键 转账方编号*TIME_SPAN+时间偏移（秒），按转账方、时间排序后可一次二分查找所有起点的时间范围
+TIME_SPAN = 1 << 34
+
+
+class TransferIndex:
+    """按转账方分组、组内按时间排序的单笔转账索引，供多跳资金追踪查询
+
+    交易双方与单笔转账表一致（微信红包为对方微信名→检材微信名），金额为整数分，时间无法解析的转账不计入。
+    names    编号→交易方名称
+    keys     复合键（见TIME_SPAN，升序），转账方u的转账为连续一段，段内按时间升序
+    times    转账时间（int64秒）
+    payees   收款方编号
+    cents    金额（整数分，无法解析为0）
+    """
+
+    def __init__(self, times, payers, payees, cents):
+        times = pd.Series(pd.to_datetime(times)).astype('datetime64[s]')
+        valid = times.notna().to_numpy()
+        seconds = times.to_numpy()[valid].view(np.int64)
+        payers = np.asarray(payers, dtype=object)[valid]
+        payees = np.asarray(payees, dtype=object)[valid]
+        codes, names = pd.factorize(np.concatenate([payers, payees]))
+        self.names = pd.Index(names, dtype=object)
+        payer_codes, payee_codes = codes[:len(payers)], codes[len(payers):]
+
+        self.origin = int(seconds.min()) if len(seconds) else 0
+        order = np.lexsort((seconds, payer_codes))
+        self.keys = payer_codes[order].astype(np.int64) * TIME_SPAN + (seconds[order] - self.origin)
+        self.times = seconds[order]
+        self.payers = payer_codes[order]
+        self.payees = payee_codes[order]
+        self.cents = np.asarray(cents, dtype=np.int64)[valid][order]
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        # 交易双方和金额与单笔转账表一致（金额无法解析为0）
+        payer, payee, amount_texts, _ = transfer_parties(transactions)
+        return cls(transactions.times, payer, payee, amounts_to_cents(amount_texts))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _offset(self, timestamp, default):
+        """时间转换为相对origin的秒数"""
+        if timestamp is None:
+            return default
+        return int(np.datetime64(pd.Timestamp(timestamp), 's').astype(np.int64)) - self.origin
+
+    def trace(self, source, hops=DEFAULT_HOPS, start=None, end=None, limit=DEFAULT_LIMIT):
+        """从source出发、在[start, end]时间窗口内最多hops跳的资金去向（按时间先后：每一跳不早于上一跳）
+
+        逐跳广度优先扩展，每个交易方只保留最早到达的路径，较晚到达不会带来新的去向，直接剪枝。
+        返回 {'source', 'total', 'results'}：total为到达的交易方数，results按跳数、到达时间排序，
+        最多limit项，每项包含交易方、跳数、到达时间和路径（逐跳的时间、转账方、收款方、金额）。
+        """
+        hops = min(max(int(hops), 1), MAX_HOPS)
+        result = {'source': source, 'total': 0, 'results': []}
+        node = self.names.get_indexer([source])[0]
+        if node < 0:
+            return result
+        # 窗口限制在复合键的时间范围内（所有转账的偏移都在[0, TIME_SPAN)中）
+        start_offset = max(self._offset(start, 0), 0)
+        end_offset = min(self._offset(end, TIME_SPAN - 1), TIME_SPAN - 1)
+        if start_offset > end_offset:
+            return result
+
+        # 到达标签：(交易方, 到达时间偏移, 上一标签, 转账下标, 跳数)，路径由上一标签回溯
+        label_nodes = [np.array([node])]
+        label_offsets = [np.array([start_offset])]
+        label_parents = [np.array([-1])]
+        label_transfers = [np.array([-1])]
+        label_hops = [np.array([0])]
+        earliest = np.full(len(self.names), TIME_SPAN, dtype=np.int64)
+        earliest[node] = start_offset
+        best_label = np.full(len(self.names), -1, dtype=np.int64)
+        count = 1
+        frontier = np.array([0])
+        frontier_nodes, frontier_offsets = label_nodes[0], label_offsets[0]
+
+        for hop in range(1, hops + 1):
+            # 所有起点的转账范围：同一转账方、不早于到达时间且不晚于窗口结束
+            lower = np.searchsorted(self.keys, frontier_nodes * TIME_SPAN + frontier_offsets)
+            upper = np.searchsorted(self.keys, frontier_nodes * TIME_SPAN + end_offset, side='right')
+            lengths = upper - lower
+            if not lengths.sum():
+                break
+            transfers = np.repeat(lower - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            parents = np.repeat(frontier, lengths)
+
+            # 每个收款方只保留最早的一笔，且必须早于此前到达该交易方的时间
+            receivers = self.payees[transfers]
+            offsets = self.times[transfers] - self.origin
+            order = np.lexsort((offsets, receivers))
+            first = order[np.flatnonzero(np.diff(receivers[order], prepend=-1) != 0)]
+            first = first[offsets[first] < earliest[receivers[first]]]
+            if not len(first):
+                break
+
+            new_nodes = receivers[first]
+            earliest[new_nodes] = offsets[first]
+            frontier = np.arange(count, count + len(first))
+            best_label[new_nodes] = frontier
+            count += len(first)
+            label_nodes.append(new_nodes)
+            label_offsets.append(offsets[first])
+            label_parents.append(parents[first])
+            label_transfers.append(transfers[first])
+            label_hops.append(np.full(len(first), hop))
+            frontier_nodes, frontier_offsets = new_nodes, offsets[first]
+
+        parents, transfers, offsets, label_hops = (np.concatenate(labels) for labels in
+                                                   (label_parents, label_transfers, label_offsets, label_hops))
+        reached = best_label[best_label >= 0]
+        reached = reached[np.lexsort((offsets[reached], label_hops[reached]))]
+        result['total'] = len(reached)
+        result['results'] = [self._path(label, parents, transfers, label_hops) for label in reached[:limit]]
+        return result
+
+    def _path(self, label, parents, transfers, label_hops):
+        steps = []
+        current = label
+        while parents[current] >= 0:
+            transfer = transfers[current]
+            steps.append({
+                '时间': self._format_time(self.times[transfer]),
+                '转账方': self.names[self.payers[transfer]],
+                '收款方': self.names[self.payees[transfer]],
+                '金额': format_cents(self.cents[transfer]),
+            })
+            current = parents[current]
+        steps.reverse()
+        return {
+            '交易方': steps[-1]['收款方'],
+            '跳数': int(label_hops[label]),
+            '到达时间': steps[-1]['时间'],
+            '路径': steps,
+        }
+
+    @staticmethod
+    def _format_time(seconds):
+        return pd.Timestamp(int(seconds), unit='s').strftime(TIME_FORMAT)
+
+
+def load_index(db_path):
+    """从报告数据库的总表建立转账索引"""
+    start = time.time()
+    columns = ', '.join(f'"{column}"' for column in INDEX_COLUMNS)
+    with closing(sqlite3.connect(db_path)) as conn:
+        frame = pd.read_sql(f'SELECT {columns} FROM "{TOTAL_TABLE}"', conn)
+    index = TransferIndex.from_transactions(Transactions(frame))
+    print(f"转账索引建立完成：{len(index)} 笔转账，耗时 {time.time() - start:.2f} 秒")
+    return index
+
+
+def trace(db_path, source, hops=DEFAULT_HOPS, start=None, end=None, limit=DEFAULT_LIMIT):
+    """资金追踪：source的资金在时间窗口内hops跳以内的去向（只查询一次时使用，多次查询应复用load_index的结果）"""
+    return load_index(db_path).trace(source, hops, start, end, limit)
+
+
+if __name__ == "__main__":
+    # 测试代码：python -m analyzers.fund_tracer 数据库文件 交易方 [跳数]
+    import json
+    import sys
+    index = load_index(sys.argv[1])
+    begin = time.time()
+    found = index.trace(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_HOPS)
+    print(json.dumps(found, ensure_ascii=False, indent=2)[:2000])
+    print(f"到达 {found['total']} 个交易方，查询耗时 {time.time() - begin:.3f} 秒")
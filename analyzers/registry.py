@@ -0,0 +1,74 @@
+import os
+from collections import namedtuple
+from analyzers import transfer_analyzer, amount_analyzer, activity_analyzer, flow_analyzer
+from analyzers.aggregate_state import StagedState
+from analyzers.transactions import load_transactions
+
+# 分析器：name为功能表名称（即数据库表名），file_name为输出文件名，
+# analyze(transactions, output_file)基于共享的流水总表解析结果（Transactions）生成功能表，成功时返回True；
+# state为可合并汇总状态的类（AggregateState的子类），不为None时analyze另接受state参数，
+# 本批结果合并进已保存的状态后输出（增量导入时功能表仍包含全部历史交易）；
+# analyze_chunks(output_file, state)为分块模式，返回逐块处理的对象（add(transactions)，全部处理完后close()，出错时discard()）；
+# source不为None时为派生功能表：由分析器source合并后的汇总状态生成（analyze(summary, output_file)），
+# 在source之后执行，不单独读取流水总表、不单独保存状态
+Analyzer = namedtuple('Analyzer', ['name', 'file_name', 'description', 'analyze', 'state', 'analyze_chunks', 'source'])
+
+# 已注册的分析器，按注册顺序执行
+ANALYZERS = []
+
+
+def register(name, file_name, description, analyze, state=None, analyze_chunks=None, source=None):
+    """注册分析器（新增功能表时在此注册，无需再读取和解析流水总表）"""
+    analyzer = Analyzer(name, file_name, description, analyze, state, analyze_chunks, source)
+    ANALYZERS.append(analyzer)
+    return analyzer
+
+
+def derived_analyzers(name):
+    """由分析器name的汇总状态派生的分析器"""
+    return [analyzer for analyzer in ANALYZERS if analyzer.source == name]
+
+
+register('单笔转账', '单笔转账.csv', '单笔转账分析', transfer_analyzer.analyze_frame,
+         analyze_chunks=transfer_analyzer.analyze_chunks)
+register('交易总额', '交易总额.csv', '交易总额分析', amount_analyzer.analyze_frame,
+         state=amount_analyzer.AmountState, analyze_chunks=amount_analyzer.analyze_chunks)
+register('交易时段', '交易时段.csv', '交易时段分析（按日、按小时）', activity_analyzer.analyze_frame,
+         state=activity_analyzer.ActivityState, analyze_chunks=activity_analyzer.analyze_chunks)
+# 资金流向图的边即交易总额的交易对，直接使用交易总额的汇总状态
+register('资金节点', '资金节点.csv', '资金流向分析（转入/转出总额、净流入、资金枢纽和往返转账）',
+         flow_analyzer.analyze_summary, source='交易总额')
+
+
+def run_analyzer(name, total_file, output_files, state_dir, rebuild, transactions=None, parsed_file=None):
+    """生成分析器name的功能表及其派生功能表，返回 ({功能表名: 是否成功}, 合并进汇总状态的各批汇总)
+
+    可在工作进程中执行（参数均可pickle）：transactions为None时自行读取流水总表（parsed_file为
+    Transactions.save_parsed写出的明细解析结果，不再重复解析），output_files为功能表名→输出路径。
+    汇总状态在此单独打开，合并结果只用于输出（关闭时丢弃）；各批汇总交回调用方，导入成功后合并提交。
+    失败的功能表删除输出文件，不会被导入。
+    """
+    analyzer = next(analyzer for analyzer in ANALYZERS if analyzer.name == name)
+    if transactions is None:
+        transactions = load_transactions(total_file, parsed_file)
+    outcome = {}
+    batches = []
+    state = None if analyzer.state is None else analyzer.state(os.path.join(state_dir, analyzer.state.FILE_NAME))
+    try:
+        if state is None:
+            outcome[name] = analyzer.analyze(transactions, output_files[name])
+        else:
+            if rebuild:
+                state.reset()
+            staged = StagedState(state)
+            outcome[name] = analyzer.analyze(transactions, output_files[name], state=staged)
+            batches = staged.batches
+        for table in derived_analyzers(name):
+            outcome[table.name] = outcome[name] and table.analyze(state.summary(), output_files[table.name])
+    finally:
+        if state is not None:
+            state.close()
+    for table, ok in outcome.items():
+        if not ok and os.path.exists(output_files[table]):
+            os.remove(output_files[table])
+    return outcome, batches
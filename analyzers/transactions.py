@@ -0,0 +1,109 @@
+import time
+import numpy as np
+import pandas as pd
+from processors.columnar import read_frame, iter_frames, map_unique, TIME_COLUMN, TIME_FORMAT
+from processors.detail_parser import parse_parties, amounts_to_cents
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EMPTY_VALUE = '<空缺>'
+
+# 明细解析结果的列式文件（供工作进程读取）及其中的列：转账方、收款方、金额文本、金额（分）
+PARSED_FILE_NAME = '流水总表解析结果.parquet'
+PARSED_COLUMNS = ['payer', 'payee', 'amount_text', 'cents']
+
+
+def fill_name(value):
+    """默认的交易方：去掉首尾空白，为空时使用<空缺>"""
+    return (str(value).strip() if pd.notna(value) else '') or EMPTY_VALUE
+
+
+def parse_times(column):
+    """时间列转换为datetime64（列式文件中已是时间戳；CSV中的文本按TIME_FORMAT解析，无法解析为NaT）"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    return pd.to_datetime(column, format=TIME_FORMAT, errors='coerce')
+
+
+def is_red_packet(tx_type):
+    return pd.notna(tx_type) and '微信红包' in str(tx_type)
+
+
+class Transactions:
+    """流水总表及其明细的解析结果，由各分析器共用（每张流水总表只读取、解析一次）
+
+    frame        流水总表（有列式文件时为带类型的列）
+    times        时间（datetime64，只解析一次，无法解析为NaT）
+    details      交易明细文本（空值为空字符串）
+    payers/payees/amount_texts  parse_parties按列解析明细的结果（未找到为None；金额文本未找到为空字符串、无法解析为None）
+    cents        金额（int64整数分，未找到或无法解析为0），各分析器以整数分累加，避免浮点误差
+    examiners/counterparts 检材微信名/对方微信名（去掉首尾空白，为空时为<空缺>）
+    red_packet   是否为微信红包记录
+    """
+
+    def __init__(self, frame, parsed=None):
+        """parsed为save_parsed写出的同一张流水总表的解析结果（read_parsed读取），给出时不再解析明细"""
+        self.frame = frame
+        self.times = parse_times(frame[TIME_COLUMN])
+        self.details = frame['交易明细'].fillna('').astype(str).tolist()
+        if parsed is None:
+            self.payers, self.payees, self.amount_texts = (
+                np.array(column, dtype=object) for column in parse_parties(self.details))
+            self.cents = amounts_to_cents(self.amount_texts)
+        else:
+            self.payers, self.payees, self.amount_texts, self.cents = parsed
+        self.examiners = map_unique(frame['检材微信名'], fill_name)
+        self.counterparts = map_unique(frame['对方微信名'], fill_name)
+        self.red_packet = map_unique(frame['交易方式'], is_red_packet).astype(bool)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def save_parsed(self, path):
+        """将明细的解析结果写入列式文件（需要pyarrow），工作进程读取后不再重复解析"""
+        pq.write_table(pa.table({
+            'payer': pa.array(self.payers, pa.string()),
+            'payee': pa.array(self.payees, pa.string()),
+            'amount_text': pa.array(self.amount_texts, pa.string()),
+            'cents': pa.array(self.cents, pa.int64()),
+        }), path)
+
+
+def read_parsed(path):
+    """读取save_parsed写出的解析结果，返回 (转账方, 收款方, 金额文本, 金额)，空值为None"""
+    table = pq.read_table(path, columns=PARSED_COLUMNS)
+    return tuple(table.column(name).to_numpy() for name in PARSED_COLUMNS)
+
+
+def load_transactions(total_file, parsed_file=None):
+    """读取并解析流水总表；指定parsed_file时读取其中的明细解析结果（见Transactions.save_parsed）"""
+    start = time.time()
+    parsed = read_parsed(parsed_file) if parsed_file else None
+    transactions = Transactions(read_frame(total_file), parsed)
+    print(f"流水总表解析完成：{len(transactions)} 条记录，耗时 {time.time() - start:.2f} 秒")
+    return transactions
+
+
+def iter_transactions(total_file, chunk_rows):
+    """分块读取并解析流水总表，每块最多chunk_rows条记录"""
+    for frame in iter_frames(total_file, chunk_rows):
+        yield Transactions(frame.reset_index(drop=True))
+
+
+def analyze_in_chunks(consumer, total_file, chunk_rows):
+    """分块模式：逐块交给consumer（add(transactions)，最后close()；出错时discard()），峰值内存由chunk_rows决定"""
+    start = time.time()
+    rows = 0
+    try:
+        for transactions in iter_transactions(total_file, chunk_rows):
+            consumer.add(transactions)
+            rows += len(transactions)
+    except Exception:
+        consumer.discard()
+        raise
+    consumer.close()
+    print(f"分块处理完成：{rows} 条记录，每块 {chunk_rows} 条，耗时 {time.time() - start:.2f} 秒")
@@ -1,95 +1,122 @@
+import time
+import numpy as np
 import pandas as pd
-import re
-from tqdm import tqdm
+from processors.csv_meta import PANDAS_LINE_TERMINATOR, write_columns, ColumnsWriter
+from processors.columnar import TIME_COLUMN, TIME_FORMAT, map_unique
+from processors.detail_parser import parse_transfers, transfer_amount_texts
+from analyzers.transactions import load_transactions, analyze_in_chunks, EMPTY_VALUE
 
+# 输出列
+HEADERS = ['时间', '转账方', '收款方', '金额']
 
-def analyze(input_file, output_file):
-    """单笔转账分析（精确金额提取版）"""
+# 微信红包记录的金额列填写的内容
+RED_PACKET_AMOUNT = '微信红包'
+
+
+def analyze(input_file, output_file, chunk_rows=None):
+    """单笔转账分析（精确金额提取版，按列处理），chunk_rows不为空时分块读取流水总表、逐块写出"""
     try:
-        df = pd.read_csv(input_file, encoding='utf-8-sig')
-
-        # 先填充原始数据中的空值
-        df = df.fillna('')
-
-        results = []
-        for _, row in tqdm(df.iterrows(), total=len(df), desc="解析转账"):
-            detail = parse_detail(row)
-            if detail:
-                results.append({
-                    '时间': str(row['时间']).strip() if pd.notna(row['时间']) and str(
-                        row['时间']).strip() else '<空缺>',
-                    '转账方': detail['payer'] if detail['payer'] and detail['payer'].strip() else '<空缺>',
-                    '收款方': detail['payee'] if detail['payee'] and detail['payee'].strip() else '<空缺>',
-                    '金额': detail.get('amount', '微信红包')
-                })
-
-        result_df = pd.DataFrame(results)
-
-        # 再次检查并填充所有空值和空字符串
-        for col in result_df.columns:
-            result_df[col] = result_df[col].apply(
-                lambda x: '<空缺>' if pd.isna(x) or (isinstance(x, str) and not x.strip()) else x
-            )
-
-        result_df.to_csv(output_file, index=False, encoding='utf-8-sig')
-        return True
+        if chunk_rows:
+            analyze_in_chunks(analyze_chunks(output_file), input_file, chunk_rows)
+            return True
+        return analyze_frame(load_transactions(input_file), output_file)
     except Exception as e:
         print(f"单笔转账分析失败: {str(e)}")
         return False
 
 
-def parse_detail(row):
-    """增强型交易明细解析"""
+class TransferChunks:
+    """分块模式：每块的单笔转账直接追加写出，不保留已处理的块"""
+
+    def __init__(self, output_file):
+        self.writer = ColumnsWriter(output_file, HEADERS, PANDAS_LINE_TERMINATOR)
+
+    def add(self, transactions):
+        self.writer.write(extract_transfers(transactions))
+
+    def close(self):
+        self.writer.close()
+
+    def discard(self):
+        self.writer.discard()
+
+
+def analyze_chunks(output_file, state=None):
+    """分块模式的单笔转账表（逐笔记录，没有需要合并的状态）"""
+    return TransferChunks(output_file)
+
+
+def analyze_frame(transactions, output_file):
+    """基于共享的流水总表解析结果生成单笔转账表"""
     try:
-        # 确保所有字段不为None
-        tx_type = str(row.get('交易方式', '')).strip() if pd.notna(row.get('交易方式')) else ''
-        tx_detail = str(row.get('交易明细', '')).strip() if pd.notna(row.get('交易明细')) else ''
-        counterpart = str(row.get('对方微信名', '')).strip() if pd.notna(row.get('对方微信名')) else '<空缺>'
-        examiner = str(row.get('检材微信名', '')).strip() if pd.notna(row.get('检材微信名')) else '<空缺>'
-
-        # 确保默认值不为空
-        counterpart = counterpart if counterpart else '<空缺>'
-        examiner = examiner if examiner else '<空缺>'
-
-        # 微信红包特殊处理
-        if '微信红包' in tx_type:
-            return {
-                'payer': counterpart,
-                'payee': examiner
-            }
-
-        # 提取转账双方
-        payer_match = re.search(r'^(.*?)\s+向', tx_detail)
-        payee_match = re.search(r'向\s*([^转发送红包]+?)(?:转账|发送|$)', tx_detail)
-
-        payer = payer_match.group(1).strip() if payer_match and payer_match.group(1).strip() else '<空缺>'
-        payee = payee_match.group(1).strip() if payee_match and payee_match.group(1).strip() else '<空缺>'
-
-        # 精确匹配金额部分
-        amount_match = re.search(
-            r'￥([\d,]+(?:\.\d{1,2})?)(?:元|\s|$)',
-            tx_detail
-        )
-
-        # 处理金额格式
-        if amount_match:
-            amount = float(amount_match.group(1).replace(',', ''))
-        else:
-            amount = 0.0
-
-        return {
-            'payer': payer,
-            'payee': payee,
-            'amount': amount
-        }
+        start = time.time()
+        # 直接按列写出，不再构造结果DataFrame
+        write_columns(output_file, HEADERS, extract_transfers(transactions), PANDAS_LINE_TERMINATOR)
+        elapsed = max(time.time() - start, 1e-6)
+        print(f"单笔转账分析完成：{len(transactions)} 条记录，耗时 {elapsed:.2f} 秒"
+              f"（{len(transactions) / elapsed:.0f} 条/秒）")
+        return True
     except Exception as e:
-        print(f"解析失败：{str(row.get('交易明细', ''))[:30]}... | 错误：{str(e)}")
-        return {
-            'payer': '<空缺>',
-            'payee': '<空缺>',
-            'amount': 0.0
-        }
+        print(f"单笔转账分析失败: {str(e)}")
+        return False
+
 
+def format_amount(text):
+    """金额文本按浮点数显示（如"3000"显示为"3000.0"），未找到或无法解析时为0.0"""
+    return str(float(text)) if isinstance(text, str) and text else '0.0'
+
+
+def transfer_parties(transactions):
+    """按列确定每笔转账的转账方、收款方，返回 (转账方, 收款方, 金额文本, 金额是否无法解析) 四个数组
+
+    明细去掉首尾空白后按本表原有的规则解析（见parse_transfers，收款方和金额规则与交易总额不同）。
+    微信红包：转账方为对方微信名、收款方为检材微信名
+    其他：使用明细中的转账方/收款方（未找到时为<空缺>），金额无法解析时双方为<空缺>
+    """
+    details, red_packet = transactions.details, transactions.red_packet
+    amount_texts = np.array(transfer_amount_texts(details), dtype=object)
+
+    # 转账方规则与共享的解析结果相同；本表的收款方字符范围更小，只在共享结果含"红""包"时可能不同。
+    # 这些明细和首尾含空白的明细（本表按去掉首尾空白后的明细解析）重新解析
+    payers, payees = transactions.payers, transactions.payees
+    redo = [i for i, (detail, payee) in enumerate(zip(details, payees))
+            if detail != detail.strip() or (payee is not None and ('红' in payee or '包' in payee))]
+    if redo:
+        payers, payees = payers.copy(), payees.copy()
+        payers[redo], payees[redo], _ = (np.array(column, dtype=object) for column in
+                                         parse_transfers([details[i].strip() for i in redo]))
+    failed = pd.isna(amount_texts) & ~red_packet
+
+    # 未找到或为空的转账方/收款方均为<空缺>
+    payer = np.where(pd.isna(payers), '', payers)
+    payee = np.where(pd.isna(payees), '', payees)
+    payer[(payer == '') | failed] = EMPTY_VALUE
+    payee[(payee == '') | failed] = EMPTY_VALUE
+
+    payer = np.where(red_packet, transactions.counterparts, payer)
+    payee = np.where(red_packet, transactions.examiners, payee)
+    return payer, payee, amount_texts, failed
+
+
+def extract_transfers(transactions):
+    """按列确定单笔转账表各列，返回与HEADERS对应的字符串列表
+
+    交易双方见transfer_parties；微信红包的金额列为"微信红包"，金额无法解析时为0
+    """
+    payer, payee, amount_texts, failed = transfer_parties(transactions)
+    for i in np.flatnonzero(failed):
+        print(f"解析失败：{transactions.details[i].strip()[:30]}... | 错误：金额无法转换为数字")
+
+    # 本表逐笔列出金额，保持原有的浮点数显示（未找到或无法解析时为0.0）
+    amount = map_unique(pd.Series(amount_texts, dtype=object), format_amount)
+    amount = np.where(transactions.red_packet, RED_PACKET_AMOUNT, amount)
+
+    # 各列按构造均不为空，无需再逐格填充<空缺>
+    times = transactions.frame[TIME_COLUMN]
+    if pd.api.types.is_datetime64_any_dtype(times):
+        times = times.dt.strftime(TIME_FORMAT)
+    times = [(str(value).strip() if pd.notna(value) else '') or EMPTY_VALUE for value in times.tolist()]
+    return [times, payer.tolist(), payee.tolist(), amount.tolist()]
 
 if __name__ == "__main__":
     analyze("周志强、蒲雄鑫等人侵犯公民个人信息案报告_流水总表.csv", "test_transfer.csv")
@@ -8,11 +8,16 @@ import subprocess
 import platform
 import sqlite3
 import logging
+import threading
+import time
+import atexit
+from concurrent.futures.process import BrokenProcessPool
 from logging.handlers import RotatingFileHandler
 from flask import Flask, request, redirect, url_for, render_template, flash, jsonify, send_file
 from werkzeug.utils import secure_filename
 from ai_chat import chat_blueprint
 from pdf_processor.pdf_converter import wechat_pdf_to_excel
+from processors import csv_meta
 
 # 添加项目目录到路径，以便导入其他模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +30,20 @@ app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'output'
 app.config['LOGS_FOLDER'] = 'logs'
 app.config['DATABASE_FOLDER'] = 'database'
+# 直接从上传的ZIP读取报告页面（无法直接读取时回退到解压）
+app.config['ZIP_DIRECT_READ'] = True
+# 步骤1共享进程池的进程数（None表示使用全部CPU核心）
+app.config['WORKER_POOL_PROCESSES'] = None
+# 调试用：是否保留步骤1~3的中间CSV（logs目录）
+app.config['KEEP_INTERMEDIATE_CSV'] = os.getenv("KEEP_INTERMEDIATE_CSV", "false").lower() == "true"
+# 增量导入：同一报告（按上传的ZIP文件名区分）重复上传时只处理和导入新增交易；去重索引按报告保存在其数据库目录中，
+# 报告内按检材（微信号）分别记录。以其他名称上传的重叠导出是另一个报告，有各自的数据库，不与此前的报告去重
+app.config['INCREMENTAL_INGEST'] = os.getenv("INCREMENTAL_INGEST", "false").lower() == "true"
+# 分析和导入分块处理流水总表的每块记录数（0表示整表读入内存；流水总表超出内存时设置，如500000）
+app.config['ANALYSIS_CHUNK_ROWS'] = int(os.getenv("ANALYSIS_CHUNK_ROWS", "0"))
+# 分析阶段的工作进程数：默认1，各分析器在线程中共用只解析一次的流水总表；
+# 大于1时（需要列式文件）各分析器在长期复用的工作进程中执行，明细的解析结果通过列式文件传递，不再重复解析
+app.config['ANALYSIS_PROCESSES'] = int(os.getenv("ANALYSIS_PROCESSES", "1"))
 
 # 注册AI聊天蓝图
 app.register_blueprint(chat_blueprint, url_prefix='/api')
@@ -52,6 +71,62 @@ app.logger.setLevel(logging.INFO)
 # 存储任务状态的字典
 tasks = {}
 
+# 所有任务共用的步骤1进程池（首次处理报告时创建）
+shared_pool = None
+shared_pool_lock = threading.Lock()
+
+# 所有任务共用的分析工作进程池（ANALYSIS_PROCESSES大于1时，首次使用时创建）
+analysis_workers = None
+analysis_workers_lock = threading.Lock()
+
+# 资金追踪的转账索引（报告名→(数据库修改时间, 索引)），数据库更新后重新建立
+trace_indexes = {}
+# 各报告建立索引时持有的锁（报告名→锁），trace_indexes_lock只保护该字典
+trace_index_locks = {}
+trace_indexes_lock = threading.Lock()
+
+
+def get_shared_pool():
+    """获取应用级共享进程池，多个任务并发时按任务轮询调度页面作业"""
+    global shared_pool
+    with shared_pool_lock:
+        if shared_pool is None:
+            from processors.worker_pool import SharedPool
+            shared_pool = SharedPool(processes=app.config['WORKER_POOL_PROCESSES'])
+            # 应用退出时关闭工作进程
+            atexit.register(shared_pool.close)
+        return shared_pool
+
+
+def get_analysis_workers(reset=False):
+    """获取分析阶段共用的工作进程池（spawn方式启动，在任务线程中创建也安全）；reset为True时先关闭已损坏的进程池"""
+    global analysis_workers
+    with analysis_workers_lock:
+        if reset and analysis_workers is not None:
+            analysis_workers.shutdown(wait=False, cancel_futures=True)
+            analysis_workers = None
+        if analysis_workers is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            analysis_workers = ProcessPoolExecutor(max_workers=app.config['ANALYSIS_PROCESSES'],
+                                                   mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(analysis_workers.shutdown, cancel_futures=True)
+        return analysis_workers
+
+
+def get_trace_index(report_name, db_path):
+    """获取报告的转账索引（首次查询时从数据库建立，之后复用）"""
+    from analyzers.fund_tracer import load_index
+    mtime = os.path.getmtime(db_path)
+    # 建立索引时只持有该报告的锁：其他报告的查询不受影响，同一报告的并发查询等待同一次建立完成
+    with trace_indexes_lock:
+        report_lock = trace_index_locks.setdefault(report_name, threading.Lock())
+    with report_lock:
+        cached = trace_indexes.get(report_name)
+        if cached is None or cached[0] != mtime:
+            cached = trace_indexes[report_name] = (mtime, load_index(db_path))
+        return cached[1]
+
 
 def extract_zip_external(zip_path, extract_dir):
     """
@@ -119,6 +194,39 @@ def extract_zip_external(zip_path, extract_dir):
         return (False, error_msg)
 
 
+def prepare_extracted_input(zip_path, file_dir):
+    """解压报告ZIP并确定步骤1的输入目录，解压失败时返回None"""
+    # 解压到文件专属目录
+    success, message = extract_zip_external(zip_path, file_dir)
+    if not success:
+        app.logger.error(f"使用外部工具解压失败: {message}")
+        return None
+    # 删除ZIP文件
+    os.remove(zip_path)
+    # 查找包含 "-files" 的目录
+    files_dir = None
+    for item in os.listdir(file_dir):
+        item_path = os.path.join(file_dir, item)
+        if os.path.isdir(item_path) and "-files" in item:
+            files_dir = item_path
+            break
+    if files_dir:
+        input_dir = files_dir
+        app.logger.info(f"找到 -files 目录作为输入: {input_dir}")
+    else:
+        # 如果没有找到 -files 目录，查找任何目录作为输入
+        for item in os.listdir(file_dir):
+            item_path = os.path.join(file_dir, item)
+            if os.path.isdir(item_path):
+                input_dir = item_path
+                app.logger.info(f"使用目录作为输入: {input_dir}")
+                break
+        else:
+            input_dir = file_dir
+            app.logger.info(f"没有找到子目录，使用解压根目录作为输入")
+    return input_dir
+
+
 def get_report_name(input_dir):
     """获取报告名称，通常是取证报告的名称或者目录名称"""
     # 从输入目录路径中提取文件夹名称
@@ -137,8 +245,8 @@ def get_report_name(input_dir):
     return dir_name
 
 
-def update_task_status(task_id, status, message=None, progress=None, files=None, report_name=None):
-    """更新任务状态"""
+def update_task_status(task_id, status, message=None, progress=None, files=None, report_name=None, stages=None):
+    """更新任务状态（stages为各阶段的耗时：阶段名→秒）"""
     if task_id not in tasks:
         tasks[task_id] = {
             'id': task_id,
@@ -148,7 +256,8 @@ def update_task_status(task_id, status, message=None, progress=None, files=None,
             'report_name': '',
             'start_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'end_time': None,
-            'files': []
+            'files': [],
+            'stages': {}
         }
 
     if status:
@@ -169,9 +278,16 @@ def update_task_status(task_id, status, message=None, progress=None, files=None,
     if files:
         tasks[task_id]['files'] = files
 
+    if stages:
+        tasks[task_id]['stages'].update(stages)
+
 
 def process_report(task_id, input_dir, original_filename):
     """异步处理报告文件"""
+    index = None
+    states = {}
+    # 是否重新建立数据库和汇总状态（非增量导入，或报告的数据库尚不存在）
+    rebuild = True
     try:
         # 初始化目录
         report_name = original_filename
@@ -204,99 +320,246 @@ def process_report(task_id, input_dir, original_filename):
         # 数据库路径
         db_path = os.path.join(db_dir, f"{report_name}.db")
 
-        # 步骤1: 提取基础流水表格
-        update_task_status(task_id, 'processing', '步骤1: 提取基础流水表格', 20)
+        # 步骤1~4: 融合流水线，直接生成流水总表（调试模式下同时保留中间文件）
+        update_task_status(task_id, 'processing', '步骤1~4: 提取并整理流水，生成流水总表', 20)
         try:
-            from processors import step1_extract
-            # 中间文件放在logs目录
-            step1_output = os.path.join(logs_dir, "step1_basic_transactions.csv")
-            step1_extract.process(input_dir, step1_output)
-            app.logger.info(f"基础流水表格生成成功: {step1_output}")
-        except Exception as e:
-            app.logger.error(f"步骤1失败: {str(e)}", exc_info=True)
-            update_task_status(task_id, 'failed', f'步骤1失败: {str(e)}')
-            return
-
-        # 步骤2: 整理流水表格
-        update_task_status(task_id, 'processing', '步骤2: 整理流水表格', 40)
-        try:
-            from processors import step2_organize
-            # 中间文件放在logs目录
-            step2_output = os.path.join(logs_dir, "step2_organized_transactions.csv")
-            step2_organize.process(step1_output, step2_output)
-            app.logger.info(f"流水表格整理成功: {step2_output}")
-        except Exception as e:
-            app.logger.error(f"步骤2失败: {str(e)}", exc_info=True)
-            update_task_status(task_id, 'failed', f'步骤2失败: {str(e)}')
-            return
-
-        # 步骤3: 去重处理
-        update_task_status(task_id, 'processing', '步骤3: 去重处理', 60)
-        try:
-            from processors import step3_deduplicate
-            # 中间文件放在logs目录
-            step3_output = os.path.join(logs_dir, "step3_deduplicated_transactions.csv")
-            step3_deduplicate.process(step2_output, step3_output)
-            app.logger.info(f"去重处理完成: {step3_output}")
-        except Exception as e:
-            app.logger.error(f"步骤3失败: {str(e)}", exc_info=True)
-            update_task_status(task_id, 'failed', f'步骤3失败: {str(e)}')
-            return
-
-        # 步骤4: 简化处理，生成流水总表
-        update_task_status(task_id, 'processing', '步骤4: 简化处理，生成流水总表', 70)
-        try:
-            from processors import step4_simplify
-            # 最终文件放在output目录，使用中文名称
+            from processors import pipeline
+            # 最终文件放在output目录，使用中文名称；中间文件放在logs目录
             total_transactions_file = os.path.join(output_dir, "流水总表.csv")
-            step4_simplify.process(step3_output, total_transactions_file)
-            app.logger.info(f"流水总表生成成功: {total_transactions_file}")
+            debug_dir = logs_dir if app.config['KEEP_INTERMEDIATE_CSV'] else None
+            if app.config['INCREMENTAL_INGEST']:
+                from processors.ingest_index import IngestIndex, INDEX_FILE_NAME
+                # 索引按报告保存在数据库目录中，只对同一报告的重复上传去重；
+                # 数据库不存在时（首次上传或已被删除）此前的记录无效，全部交易重新导入
+                index = IngestIndex(os.path.join(db_dir, INDEX_FILE_NAME))
+                rebuild = not os.path.exists(db_path)
+                if rebuild:
+                    index.reset()
+            start = time.time()
+            stats = pipeline.run(input_dir, total_transactions_file, debug_dir=debug_dir, index=index,
+                                 cache_dir=logs_dir, pool=get_shared_pool())
+            update_task_status(task_id, None, stages={'生成流水总表': round(time.time() - start, 2)})
+            app.logger.info(f"流水总表生成成功: {total_transactions_file}，共 {stats['total']} 条记录；"
+                            f"共 {stats['pages']} 个页面，预筛选跳过 {stats['skipped']} 个，"
+                            f"缓存命中 {stats['cache_hits']} 个")
+            if index is not None:
+                app.logger.info(f"增量导入：跳过此前已导入的交易 {stats['existing']} 条")
         except Exception as e:
-            app.logger.error(f"步骤4失败: {str(e)}", exc_info=True)
-            update_task_status(task_id, 'failed', f'步骤4失败: {str(e)}')
+            app.logger.error(f"生成流水总表失败: {str(e)}", exc_info=True)
+            update_task_status(task_id, 'failed', f'生成流水总表失败: {str(e)}')
             return
 
-        # 分析1: 生成单笔转账表
-        update_task_status(task_id, 'processing', '分析1: 生成单笔转账表', 80)
-        try:
-            from analyzers import transfer_analyzer
-            # 分析结果放在output目录，使用中文名称
-            transfer_file = os.path.join(output_dir, "单笔转账.csv")
-            transfer_analyzer.analyze(total_transactions_file, transfer_file)
-            app.logger.info("单笔转账分析表生成成功")
-        except Exception as e:
-            app.logger.error(f"分析1失败: {str(e)}", exc_info=True)
-            update_task_status(task_id, 'failed', f'分析1失败: {str(e)}')
+        # 增量导入时没有新增交易：无需分析和导入，数据库保持不变
+        if not rebuild and stats['total'] == 0:
+            files = [
+                {
+                    'name': f"{report_name}.db",
+                    'path': db_path,
+                    'type': 'database',
+                    'description': '数据库文件'
+                }
+            ]
+            update_task_status(task_id, 'completed', '处理完成：没有新增交易，数据库未变更', 100, files)
+            app.logger.info(f"任务 {task_id} 完成（没有新增交易）")
             return
 
-        # 分析2: 生成交易总额表
-        update_task_status(task_id, 'processing', '分析2: 生成交易总额表', 85)
-        try:
-            from analyzers import amount_analyzer
-            # 分析结果放在output目录，使用中文名称
-            amount_file = os.path.join(output_dir, "交易总额.csv")
-            amount_analyzer.analyze(total_transactions_file, amount_file)
-            app.logger.info("交易总额分析表生成成功")
-        except Exception as e:
-            app.logger.error(f"分析2失败: {str(e)}", exc_info=True)
-            update_task_status(task_id, 'failed', f'分析2失败: {str(e)}')
-            return
+        # 分析: 流水总表只读取、解析一次（分块模式下逐块读取），由已注册的分析器共用
+        from analyzers.registry import ANALYZERS
+        from importer import database_importer
+        chunk_rows = app.config['ANALYSIS_CHUNK_ROWS']
+        # 分析结果放在output目录，使用中文名称
+        analysis_files = [
+            {
+                'name': analyzer.file_name,
+                'path': os.path.join(output_dir, analyzer.file_name),
+                'type': 'report',
+                'description': analyzer.description
+            }
+            for analyzer in ANALYZERS
+        ]
+        analysis_paths = {analyzer.name: file['path'] for analyzer, file in zip(ANALYZERS, analysis_files)}
+        # 读取流水总表的分析器；派生功能表在其源分析器之后由汇总状态生成
+        sources = [analyzer for analyzer in ANALYZERS if analyzer.source is None]
+
+        # 增量导入失败时撤销本次对数据库的写入（增量索引未提交，下次上传会重新导入这些交易）：
+        # 重新建立时删除数据库，否则删除本次追加的行
+        marks = database_importer.append_marks(report_name) if index is not None and not rebuild else None
+
+        def discard_import():
+            if index is None:
+                return
+            if rebuild:
+                if os.path.exists(db_path):
+                    os.remove(db_path)
+            else:
+                database_importer.undo_appends(report_name, marks)
+
+        def open_states():
+            """打开各分析器的汇总状态（放在数据库目录）；增量导入时只合并新增交易，否则流水总表即全部交易，重新建立"""
+            for analyzer in ANALYZERS:
+                if analyzer.state is not None:
+                    state = states[analyzer.name] = analyzer.state(os.path.join(db_dir, analyzer.state.FILE_NAME))
+                    if rebuild:
+                        state.reset()
+
+        if chunk_rows:
+            update_task_status(task_id, 'processing', '分析: 分块处理流水总表', 75)
+            consumers = []
+            try:
+                from analyzers.transactions import iter_transactions
+                start = time.time()
+                open_states()
+                for analyzer in sources:
+                    consumers.append(analyzer.analyze_chunks(analysis_paths[analyzer.name], states.get(analyzer.name)))
+                rows = 0
+                for transactions in iter_transactions(total_transactions_file, chunk_rows):
+                    for consumer in consumers:
+                        consumer.add(transactions)
+                    rows += len(transactions)
+                    update_task_status(task_id, 'processing', f'分析: 已处理 {rows}/{stats["total"]} 条记录',
+                                       75 + 15 * rows // max(stats['total'], 1))
+                for consumer in consumers:
+                    consumer.close()
+                analyzed = {analyzer.name: True for analyzer in sources}
+                for analyzer in ANALYZERS:
+                    if analyzer.source is not None:
+                        path = analysis_paths[analyzer.name]
+                        analyzed[analyzer.name] = analyzer.analyze(states[analyzer.source].summary(), path)
+                        if not analyzed[analyzer.name] and os.path.exists(path):
+                            os.remove(path)
+                update_task_status(task_id, None, stages={'分块分析': round(time.time() - start, 2)})
+                app.logger.info(f"分块分析完成：{rows} 条记录，每块 {chunk_rows} 条")
+            except Exception as e:
+                app.logger.error(f"分块分析失败: {str(e)}", exc_info=True)
+                # 关闭并删除只写了一部分的功能表，不留下打开的文件
+                for consumer in consumers:
+                    consumer.discard()
+                update_task_status(task_id, 'failed', f'分块分析失败: {str(e)}')
+                return
+
+            # 导入数据库
+            update_task_status(task_id, 'processing', '导入分析结果到数据库', 90)
+            try:
+                start = time.time()
+                imported = database_importer.import_to_database(
+                    report_name=report_name,  # 使用原始文件名
+                    total_table_path=total_transactions_file,
+                    analysis_dir=output_dir,
+                    incremental=not rebuild,
+                    chunk_rows=chunk_rows
+                )
+                update_task_status(task_id, None, stages={'导入数据库': round(time.time() - start, 2)})
+            except Exception as e:
+                app.logger.error(f"数据库导入失败: {str(e)}", exc_info=True)
+                discard_import()
+                update_task_status(task_id, 'failed', f'数据库导入失败: {str(e)}')
+                return
+        else:
+            from processors import columnar
+            from processors.worker_pool import Stage, run_graph
+            from analyzers.registry import run_analyzer
+            from analyzers.transactions import load_transactions, PARSED_FILE_NAME
+            # 流水总表只读取、解析一次：默认各分析器在线程中共用解析结果；设置了多个工作进程且有列式文件时，
+            # 明细的解析结果写入列式文件，各分析器在工作进程中读取列式文件（只传递文件路径，不再重复解析）
+            workers = None
+            parsed_file = None
+            update_task_status(task_id, 'processing', '分析: 解析流水总表', 75)
+            try:
+                start = time.time()
+                transactions = load_transactions(total_transactions_file)
+                if app.config['ANALYSIS_PROCESSES'] > 1 and columnar.is_fresh(total_transactions_file):
+                    parsed_file = os.path.join(logs_dir, PARSED_FILE_NAME)
+                    transactions.save_parsed(parsed_file)
+                    transactions = None
+                    workers = get_analysis_workers()
+                update_task_status(task_id, None, stages={'解析流水总表': round(time.time() - start, 2)})
+            except Exception as e:
+                app.logger.error(f"解析流水总表失败: {str(e)}", exc_info=True)
+                update_task_status(task_id, 'failed', f'解析流水总表失败: {str(e)}')
+                return
+
+            # 阶段图：各分析器和总表导入只依赖流水总表，并发执行；
+            # 功能表导入在其后（与总表导入依次写入同一数据库），只导入生成成功的功能表
+            incremental = not rebuild
+            stages = [Stage(analyzer.name, run_analyzer,
+                            (analyzer.name, total_transactions_file, analysis_paths, db_dir, rebuild,
+                             transactions, parsed_file),
+                            process=True)
+                      for analyzer in sources]
+            stages.append(Stage('导入总表', database_importer.import_tables, (
+                report_name, {"总表": total_transactions_file, "流水总表": total_transactions_file}, incremental)))
+            stages.append(Stage('导入功能表', lambda: database_importer.import_tables(
+                report_name, {os.path.splitext(analyzer.file_name)[0]: analysis_paths[analyzer.name]
+                              for analyzer in ANALYZERS if analyzed.get(analyzer.name)}, incremental),
+                depends=[analyzer.name for analyzer in sources] + ['导入总表']))
+
+            def stage_done(name, result, elapsed):
+                finished.append(name)
+                update_task_status(task_id, 'processing', f'分析和导入: {name}完成（{elapsed:.2f} 秒）',
+                                   80 + 15 * len(finished) // len(stages), stages={name: round(elapsed, 2)})
+                if name in batches:
+                    outcome, batches[name] = result
+                    analyzed.update(outcome)
+                    for table, ok in outcome.items():
+                        if ok:
+                            app.logger.info(f"{table}分析表生成成功")
+                        else:
+                            app.logger.error(f"{table}分析表生成失败")
+                    if not outcome[name]:
+                        # 失败的分析器的汇总不合并进汇总状态
+                        batches[name] = []
+
+            update_task_status(task_id, 'processing', f'分析和导入: 并发执行{len(stages)}个阶段', 80)
+            finished = []
+            analyzed = {}
+            batches = {analyzer.name: [] for analyzer in sources}
+            try:
+                start = time.time()
+                results = run_graph(stages, workers, on_done=stage_done)
+                imported = results['导入总表'] and results['导入功能表']
+                # 各批汇总合并进主进程的汇总状态（只涉及本批分组，耗时很少）
+                open_states()
+                for name, state in states.items():
+                    for summary in batches[name]:
+                        state.add(summary)
+                app.logger.info(f"分析和导入完成，耗时 {time.time() - start:.2f} 秒，"
+                                f"各阶段耗时：{tasks[task_id]['stages']}")
+            except Exception as e:
+                app.logger.error(f"分析和导入失败: {str(e)}", exc_info=True)
+                if isinstance(e, BrokenProcessPool):
+                    # 工作进程异常退出后进程池不可再用，重新创建
+                    get_analysis_workers(reset=True)
+                discard_import()
+                update_task_status(task_id, 'failed', f'分析和导入失败: {str(e)}')
+                return
+            finally:
+                if parsed_file is not None and os.path.exists(parsed_file):
+                    os.remove(parsed_file)
+
+        # 只列出生成成功的功能表
+        files = [
+            {
+                'name': '流水总表.csv',
+                'path': total_transactions_file,
+                'type': 'report',
+                'description': '流水总表'
+            },
+            *(file for analyzer, file in zip(ANALYZERS, analysis_files) if analyzed.get(analyzer.name))
+        ]
 
-        # 导入数据库
-        update_task_status(task_id, 'processing', '导入分析结果到数据库', 90)
-        try:
-            from importer import database_importer
-            # 注意调整函数参数以匹配实际定义
-            database_importer.import_to_database(
-                report_name=report_name,  # 使用原始文件名
-                total_table_path=total_transactions_file,
-                analysis_dir=output_dir
-            )
-            app.logger.info(f"数据库导入成功: {db_path}")
-        except Exception as e:
-            app.logger.error(f"数据库导入失败: {str(e)}", exc_info=True)
-            update_task_status(task_id, 'failed', f'数据库导入失败: {str(e)}')
+        # 分析和导入都成功后才将本次的新增交易记入增量索引和汇总状态，否则下次上传时重新处理
+        failed = [analyzer.name for analyzer in ANALYZERS if not analyzed.get(analyzer.name)]
+        if failed or not imported:
+            message = f"分析失败: {'、'.join(failed)}" if failed else "数据库导入失败"
+            app.logger.error(f"任务 {task_id} {message}，未更新增量索引和汇总状态")
+            discard_import()
+            update_task_status(task_id, 'failed', message, files=files)
             return
+        if index is not None:
+            index.commit()
+        for state in states.values():
+            state.commit()
+        app.logger.info(f"数据库导入成功: {db_path}")
 
         # 更新配置文件
         update_task_status(task_id, 'processing', '更新配置文件', 95)
@@ -310,32 +573,12 @@ def process_report(task_id, input_dir, original_filename):
             return
 
         # 准备文件列表 - 不在此处生成URL
-        files = [
-            {
-                'name': '流水总表.csv',
-                'path': total_transactions_file,
-                'type': 'report',
-                'description': '流水总表'
-            },
-            {
-                'name': '单笔转账.csv',
-                'path': transfer_file,
-                'type': 'report',
-                'description': '单笔转账分析'
-            },
-            {
-                'name': '交易总额.csv',
-                'path': amount_file,
-                'type': 'report',
-                'description': '交易总额分析'
-            },
-            {
-                'name': f"{report_name}.db",
-                'path': db_path,
-                'type': 'database',
-                'description': '数据库文件'
-            }
-        ]
+        files.append({
+            'name': f"{report_name}.db",
+            'path': db_path,
+            'type': 'database',
+            'description': '数据库文件'
+        })
 
         update_task_status(task_id, 'completed', '处理完成', 100, files)
         app.logger.info(f"任务 {task_id} 完成")
@@ -343,6 +586,11 @@ def process_report(task_id, input_dir, original_filename):
     except Exception as e:
         app.logger.error(f"处理报告时出现未知错误: {str(e)}", exc_info=True)
         update_task_status(task_id, 'failed', f'处理报告时出现未知错误: {str(e)}')
+    finally:
+        if index is not None:
+            index.close()
+        for state in states.values():
+            state.close()
 
 
 def process_pdf(task_id, pdf_path, original_filename):
@@ -457,35 +705,16 @@ def upload():
             zip_path = os.path.join(file_dir, file.filename)
             file.save(zip_path)
             app.logger.info(f"ZIP文件已保存: {zip_path}")
-            # 解压到文件专属目录
-            success, message = extract_zip_external(zip_path, file_dir)
-            if not success:
-                app.logger.error(f"使用外部工具解压失败: {message}")
-                flash('解压文件失败，请检查文件完整性', 'error')
-                return redirect(url_for('index'))
-            # 删除ZIP文件
-            os.remove(zip_path)
-            # 查找包含 "-files" 的目录
-            files_dir = None
-            for item in os.listdir(file_dir):
-                item_path = os.path.join(file_dir, item)
-                if os.path.isdir(item_path) and "-files" in item:
-                    files_dir = item_path
-                    break
-            if files_dir:
-                input_dir = files_dir
-                app.logger.info(f"找到 -files 目录作为输入: {input_dir}")
+            from processors import step1_extract
+            if app.config['ZIP_DIRECT_READ'] and step1_extract.can_read_zip(zip_path):
+                # 步骤1直接从ZIP读取页面，无需解压
+                input_dir = zip_path
+                app.logger.info(f"直接从ZIP读取报告页面: {input_dir}")
             else:
-                # 如果没有找到 -files 目录，查找任何目录作为输入
-                for item in os.listdir(file_dir):
-                    item_path = os.path.join(file_dir, item)
-                    if os.path.isdir(item_path):
-                        input_dir = item_path
-                        app.logger.info(f"使用目录作为输入: {input_dir}")
-                        break
-                else:
-                    input_dir = file_dir
-                    app.logger.info(f"没有找到子目录，使用解压根目录作为输入")
+                input_dir = prepare_extracted_input(zip_path, file_dir)
+                if input_dir is None:
+                    flash('解压文件失败，请检查文件完整性', 'error')
+                    return redirect(url_for('index'))
             # 生成任务ID
             task_id = str(uuid.uuid4())
             update_task_status(task_id, 'initialized', '任务已初始化，准备处理', 0, report_name=original_filename)
@@ -617,7 +846,7 @@ def preview_file(task_id, file_name):
             csv_reader = csv.reader(f)
             headers = next(csv_reader)
             row_count = 0
-            total_rows = sum(1 for _ in open(file_path, encoding='utf-8-sig')) - 1
+            total_rows = csv_meta.count_rows(file_path)
 
             for row in csv_reader:
                 preview_data.append(row)
@@ -674,16 +903,22 @@ def api_preview_data(task_id, file_name):
 
         # 根据文件扩展名选择读取方式
         if file_name.endswith('.csv'):
-            df = pd.read_csv(file_path, encoding='utf-8-sig')
+            # 只读取样本行（有列式文件时优先读取），总行数取自行数元数据
+            from processors import columnar
+            df = columnar.read_frame(file_path, nrows=SAMPLE_DATA_ROWS)
+            for column in df.select_dtypes('datetime').columns:
+                df[column] = df[column].dt.strftime(columnar.TIME_FORMAT)
+            total_rows = csv_meta.count_rows(file_path)
         elif file_name.endswith('.xlsx'):
             df = pd.read_excel(file_path)
+            total_rows = len(df)
         else:
             return jsonify({"error": "Unsupported file format"}), 400
 
         return jsonify({
             "columns": df.columns.tolist(),
             "data": df.head(SAMPLE_DATA_ROWS).values.tolist(),  # 使用环境变量中配置的样本行数
-            "total_rows": len(df),
+            "total_rows": total_rows,
             "sample_rows": SAMPLE_DATA_ROWS,  # 返回样本行数配置
             "report_name": report_name,  # 添加报告名称，便于前端显示
             "file_name": file_name  # 添加文件名称
@@ -810,7 +1045,7 @@ def preview_report(report_name, file_name):
                 csv_reader = csv.reader(f)
                 headers = next(csv_reader)
                 row_count = 0
-                total_rows = sum(1 for _ in open(file_path, encoding='utf-8-sig')) - 1
+                total_rows = csv_meta.count_rows(file_path)
                 for row in csv_reader:
                     preview_data.append(row)
                     row_count += 1
@@ -852,6 +1087,45 @@ def preview_report(report_name, file_name):
                            report_name=report_name)
 
 
+@app.route('/api/trace/<report_name>')
+def api_trace(report_name):
+    """资金追踪：交易方的资金在时间窗口内若干跳以内的去向
+
+    参数：party 交易方（必填），hops 跳数，start/end 时间窗口（如 2023-01-01 或 2023-01-01 12:00:00），limit 返回的交易方个数（不小于1）
+    """
+    try:
+        from analyzers import fund_tracer
+        party = request.args.get('party', '').strip()
+        if not party:
+            return jsonify({"error": "缺少参数party"}), 400
+        db_path = os.path.join(app.config['DATABASE_FOLDER'], report_name, f"{report_name}.db")
+        if not os.path.exists(db_path):
+            return jsonify({"error": f"Report not found: {report_name}"}), 404
+        try:
+            hops = request.args.get('hops', fund_tracer.DEFAULT_HOPS, type=int)
+            limit = request.args.get('limit', fund_tracer.DEFAULT_LIMIT, type=int)
+            if limit < 1:
+                return jsonify({"error": "参数limit须为正整数"}), 400
+            start = request.args.get('start') or None
+            end = request.args.get('end') or None
+            if start is not None:
+                start = datetime.datetime.fromisoformat(start)
+            if end is not None:
+                # 只有日期时包含当天全天
+                end = datetime.datetime.fromisoformat(end) + (
+                    datetime.timedelta(days=1, seconds=-1) if len(end) <= 10 else datetime.timedelta())
+        except ValueError as e:
+            return jsonify({"error": f"参数错误: {str(e)}"}), 400
+
+        index = get_trace_index(report_name, db_path)
+        result = index.trace(party, hops=hops, start=start, end=end, limit=limit)
+        result['report_name'] = report_name
+        return jsonify(result)
+    except Exception as e:
+        app.logger.error(f"资金追踪失败: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/download/report/<report_name>/<file_name>')
 def download_report_file(report_name, file_name):
     """直接通过报告名和文件名下载文件"""
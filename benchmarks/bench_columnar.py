@@ -0,0 +1,25 @@
+# 为已有的流水总表生成列式文件并比较读取耗时，在仓库根目录运行：
+#   python -m benchmarks.bench_columnar [流水总表.csv]
+import os
+import sys
+import time
+import pandas as pd
+from processors.columnar import ColumnarWriter, columnar_path, read_frame
+
+
+def main():
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else "流水总表.csv"
+    start = time.time()
+    frame = pd.read_csv(csv_file, encoding='utf-8-sig', dtype=object, keep_default_na=False)
+    print(f"读取CSV：{time.time() - start:.2f} 秒")
+    with ColumnarWriter(csv_file, frame.columns) as table:
+        table.write_columns([frame[name].tolist() for name in frame.columns])
+    start = time.time()
+    read_frame(csv_file, columns=['交易明细', '交易方式', '检材微信名', '对方微信名'])
+    print(f"读取列式文件（4列）：{time.time() - start:.2f} 秒")
+    print(f"文件大小：CSV {os.path.getsize(csv_file) / 1e6:.1f} MB，"
+          f"列式 {os.path.getsize(columnar_path(csv_file)) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# 微基准：各阶段解析交易明细时每条明细的平均耗时，在仓库根目录运行：
+#   python -m benchmarks.bench_detail_parser [步骤2输出.csv]
+# 不传入文件时使用内置样例
+import csv
+import sys
+import timeit
+from processors.detail_parser import normalize_detail, split_details, parse_parties, parse_transfers
+
+SAMPLES = [
+    '张三（wxid_a1） 2019-11-18 00:56:24 张三 向 赵六 转账 ￥0.01 [交易单号：4443818037] 微信转账',
+    '（wxid_b2） 2020-11-08 14:18:59 向  转账 ￥3,000 交易单号：2692920493 微信转账',
+    '红姐（wxid_c3） 2021-10-16 16:25:37 发送 红包 ￥100.00 微信红包',
+]
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8-sig') as f:
+            samples = [row[6] for row in csv.reader(f) if len(row) > 6][1:]
+    else:
+        samples = SAMPLES * 1000
+
+    # 步骤3逐条清洗，步骤4和分析器按列处理
+    normalized = [normalize_detail(s) for s in samples]
+    simplified = split_details(normalized)[0]
+    stages = [
+        ('normalize_detail', lambda: [normalize_detail(s) for s in samples]),
+        ('split_details', lambda: split_details(normalized)),
+        ('parse_parties', lambda: parse_parties(simplified)),
+        ('parse_transfers', lambda: parse_transfers(simplified)),
+    ]
+    for name, func in stages:
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{name:<26} {seconds / len(samples) * 1e6:8.2f} 微秒/条  ({len(samples)} 条)")
+
+
+if __name__ == "__main__":
+    main()
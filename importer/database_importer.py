@@ -4,34 +4,109 @@ import sqlite3
 import pandas as pd
 from tqdm import tqdm
 
+# 增量导入时追加而非替换的表（逐笔记录的表，新上传只包含新增交易）
+APPEND_TABLES = {"总表", "流水总表", "单笔转账"}
 
-def import_to_database(report_name, total_table_path, analysis_dir):
-    """将总表和功能表导入SQLite数据库"""
-    # 创建数据库目录
-    db_dir = os.path.join("database", report_name)
-    os.makedirs(db_dir, exist_ok=True)
 
+def table_mode(table_name, incremental):
+    """表的写入方式"""
+    return 'append' if incremental and table_name in APPEND_TABLES else 'replace'
+
+
+# 各表已知列的类型（与读取整个CSV时推断的类型一致）：数值列固定为数值类型，名称、时间等文本列固定为文本，
+# 不随数据内容或分块大小变化（如全为数字的微信名），整表导入和分块导入得到相同的表结构。
+# 未列出的列（如单笔转账的金额，有微信红包时为文本，否则为数字）仍按pandas默认规则推断
+TEXT_COLUMNS = ["时间", "平台", "检材微信名", "微信号", "对方微信名", "对方微信号", "交易明细", "交易单号", "交易方式",
+                "转账方", "收款方", "交易方", "粒度", "时段"]
+COLUMN_DTYPES = {
+    "总金额": "float64", "转入总额": "float64", "转出总额": "float64", "净流入": "float64",
+    "交易数": "Int64", "总交易数": "Int64", "微信红包个数": "Int64", "枢纽排名": "Int64", "转入笔数": "Int64",
+    "转出笔数": "Int64", "上家数": "Int64", "下家数": "Int64", "往返对象数": "Int64",
+    **dict.fromkeys(TEXT_COLUMNS, "str"),
+}
+
+
+def read_csv(csv_path, **kwargs):
+    """读取要导入的CSV（按COLUMN_DTYPES指定已知列的类型，其余列推断类型；不使用列式文件）"""
+    return pd.read_csv(csv_path, encoding='utf-8-sig', dtype=COLUMN_DTYPES, **kwargs)
+
+
+def import_table(conn, table_name, csv_path, mode, chunk_rows=None, cache=None):
+    """导入一张表，返回导入的行数；chunk_rows不为空时分块读取CSV、逐块写入
+
+    cache（CSV路径→DataFrame）用于同一CSV导入为多张表时只读取一次。
+    """
+    if not chunk_rows:
+        df = cache.get(csv_path) if cache is not None else None
+        if df is None:
+            df = read_csv(csv_path)
+            if cache is not None:
+                cache[csv_path] = df
+        df.to_sql(table_name, conn, if_exists=mode, index=False)
+        return len(df)
+
+    rows = 0
+    with read_csv(csv_path, chunksize=chunk_rows) as reader:
+        for df in reader:
+            # 第一块按表的写入方式，之后的块追加
+            df.to_sql(table_name, conn, if_exists=mode if rows == 0 else 'append', index=False)
+            rows += len(df)
+    if rows == 0:
+        read_csv(csv_path, nrows=0).to_sql(table_name, conn, if_exists=mode, index=False)
+    return rows
+
+
+def database_path(report_name):
+    """报告的SQLite数据库路径"""
+    return os.path.join("database", report_name, f"{report_name}.db")
+
+
+def append_marks(report_name):
+    """APPEND_TABLES中已有的表当前的最大rowid（增量导入前记录，用于撤销本次追加的行）"""
+    marks = {}
+    with sqlite3.connect(database_path(report_name)) as conn:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table_name in APPEND_TABLES & existing:
+            marks[table_name] = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table_name}"').fetchone()[0]
+    return marks
+
+
+def undo_appends(report_name, marks):
+    """删除增量导入追加的行（任务失败、增量索引未提交时调用，避免下次上传重复追加）"""
+    with sqlite3.connect(database_path(report_name)) as conn:
+        for table_name, rowid in marks.items():
+            conn.execute(f'DELETE FROM "{table_name}" WHERE rowid > ?', (rowid,))
+
+
+def import_tables(report_name, tables, incremental=False, chunk_rows=None):
+    """将若干表（表名→CSV路径，按顺序）导入报告的SQLite数据库，成功时返回True
+
+    incremental为True时（总表只包含跨上传去重后的新增交易），APPEND_TABLES中的表追加写入。
+    chunk_rows不为空时分块读取和写入（峰值内存由块大小决定）。
+    """
     # 数据库路径
-    db_path = os.path.join(db_dir, f"{report_name}.db")
+    db_path = database_path(report_name)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
     try:
+        cache = {}
         with sqlite3.connect(db_path) as conn:
-            # 导入总表
-            table_name = "总表"
-            df_total = pd.read_csv(total_table_path, encoding='utf-8-sig')
-            df_total.to_sql(table_name, conn, if_exists='replace', index=False)
-            print(f"\n[总表] 导入成功，记录数：{len(df_total)}")
-
-            # 导入功能表
-            analysis_files = [f for f in os.listdir(analysis_dir) if f.endswith('.csv')]
-            for file in tqdm(analysis_files, desc="导入功能表"):
-                table_name = os.path.splitext(file)[0]  # 去除.csv后缀作为表名
-                file_path = os.path.join(analysis_dir, file)
-                df = pd.read_csv(file_path, encoding='utf-8-sig')
-                df.to_sql(table_name, conn, if_exists='replace', index=False)
+            for table_name, csv_path in tqdm(tables.items(), desc="导入数据表"):
+                rows = import_table(conn, table_name, csv_path, table_mode(table_name, incremental),
+                                    chunk_rows, cache)
+                print(f"\n[{table_name}] 导入成功，记录数：{rows}")
 
         print(f"\n数据库已保存至：{os.path.abspath(db_path)}")
         return True
     except Exception as e:
         print(f"\n数据库导入失败：{str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+def import_to_database(report_name, total_table_path, analysis_dir, incremental=False, chunk_rows=None):
+    """将总表和功能表（analysis_dir中的CSV，表名为文件名）导入SQLite数据库，参数见import_tables"""
+    tables = {"总表": total_table_path}
+    for file in os.listdir(analysis_dir):
+        if file.endswith('.csv'):
+            tables[os.path.splitext(file)[0]] = os.path.join(analysis_dir, file)  # 去除.csv后缀作为表名
+    return import_tables(report_name, tables, incremental, chunk_rows)
@@ -0,0 +1,197 @@
+import os
+import numpy as np
+import pandas as pd
+from processors.csv_meta import read_row_count
+from processors.detail_parser import amount_texts, amounts_to_cents
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# 与CSV同名的列式文件（如 流水总表.csv → 流水总表.parquet），列带类型，读取时可只加载所需列
+COLUMNAR_SUFFIX = '.parquet'
+COMPRESSION = 'zstd'
+
+# 列类型：时间为时间戳，名称和微信号等重复值多的列使用字典编码，其余为字符串；
+# 时间无法按TIME_FORMAT解析时不生成列式文件（读取时使用保留原文的CSV），不会将其写为空值
+TIME_COLUMN = '时间'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DICTIONARY_COLUMNS = {'平台', '检材微信名', '微信号', '对方微信名', '对方微信号', '交易方式'}
+
+# 列式文件额外保存的派生列（CSV中没有，只在读取时显式指定才返回）；金额为int64整数分，无法解析时为空
+AMOUNT_COLUMN = '金额（分）'
+DETAIL_COLUMN = '交易明细'
+DERIVED_COLUMNS = [AMOUNT_COLUMN]
+
+# 没有列式文件时读取CSV的列类型：列式文件中为文本的列（及时间原文）按文本读取，与列式文件一致，
+# 且整表读取和分块读取相同（如全为数字的微信号不会在某些块中推断为整数）；其余列（功能表的数值列）推断类型
+CSV_DTYPES = dict.fromkeys([TIME_COLUMN, DETAIL_COLUMN, '交易单号', *sorted(DICTIONARY_COLUMNS)], str)
+
+
+def available():
+    """是否可以读写列式文件（需要pyarrow）"""
+    return pa is not None
+
+
+def columnar_path(csv_path):
+    """CSV对应的列式文件路径"""
+    return os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+
+
+def is_fresh(csv_path):
+    """列式文件是否与CSV一致：不早于CSV，且行数等于CSV的行数元数据（元数据按文件大小校验）
+
+    只比较修改时间时，在同一时间精度内被修改或以复制方式还原的CSV会误用旧的列式文件。
+    """
+    return open_fresh(csv_path) is not None
+
+
+def column_type(name):
+    if name == TIME_COLUMN:
+        return pa.timestamp('s')
+    if name == AMOUNT_COLUMN:
+        return pa.int64()
+    if name in DICTIONARY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+class ColumnarWriter:
+    """与CSV同步写出列式文件，每次write_columns写入一个行组；未安装pyarrow时不写出
+
+    先写入临时文件，close时替换正式文件，应在CSV写完并关闭之后再close。
+    遇到无法解析的时间时放弃列式文件（之后的写入不再生效），CSV照常写出。
+    用法：
+        with ColumnarWriter(csv_path, headers) as table:
+            table.write_columns(columns)
+    """
+
+    def __init__(self, csv_path, headers):
+        self.path = columnar_path(csv_path)
+        self.headers = list(headers)
+        self.writer = None
+        if available():
+            names = self.headers + (DERIVED_COLUMNS if DETAIL_COLUMN in self.headers else [])
+            self.schema = pa.schema([(name, column_type(name)) for name in names])
+            self.writer = pq.ParquetWriter(self.path + '.tmp', self.schema, compression=COMPRESSION)
+
+    def write_columns(self, columns):
+        """写入按列组织的一批记录（列顺序与headers一致）"""
+        if self.writer is None or not columns or not columns[0]:
+            return
+        arrays = []
+        for name, column in zip(self.headers, columns):
+            array = pa.array(column, pa.string())
+            if name == TIME_COLUMN:
+                try:
+                    array = pc.strptime(array, format=TIME_FORMAT, unit='s')
+                except pa.ArrowInvalid as e:
+                    print(f"时间无法解析，不生成列式文件：{e}")
+                    self.discard()
+                    return
+            elif name in DICTIONARY_COLUMNS:
+                array = array.dictionary_encode()
+            arrays.append(array)
+        if len(arrays) < len(self.schema):
+            details = columns[self.headers.index(DETAIL_COLUMN)]
+            texts = amount_texts(details)
+            arrays.append(pa.array(amounts_to_cents(texts), pa.int64(), mask=pd.isna(np.array(texts, dtype=object))))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def write_rows(self, rows):
+        self.write_columns([list(column) for column in zip(*rows)])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            os.replace(self.path + '.tmp', self.path)
+
+    def discard(self):
+        """出错时丢弃临时文件"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            os.remove(self.path + '.tmp')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def open_fresh(csv_path):
+    """打开与CSV一致的列式文件（见is_fresh），没有、已过期或为旧版本写入的时返回None"""
+    path = columnar_path(csv_path)
+    if not available():
+        return None
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(csv_path):
+            return None
+        parquet_file = pq.ParquetFile(path)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    rows = read_row_count(csv_path)
+    if rows is None or parquet_file.metadata.num_rows != rows:
+        return None
+    names = parquet_file.schema_arrow.names
+    if DETAIL_COLUMN in names and not set(DERIVED_COLUMNS).issubset(names):
+        # 旧版本写入的列式文件（派生列不同），改为读取CSV
+        return None
+    return parquet_file
+
+
+def default_columns(parquet_file):
+    return [name for name in parquet_file.schema_arrow.names if name not in DERIVED_COLUMNS]
+
+
+def read_frame(csv_path, columns=None, nrows=None):
+    """读取CSV表：有最新的列式文件时只读取所需列（带类型），否则读取CSV（列类型按CSV_DTYPES）
+
+    columns为None时返回与CSV相同的列（不含派生列）；nrows只读取前若干行。
+    """
+    if columns is not None:
+        columns = list(columns)
+    parquet_file = open_fresh(csv_path)
+    if parquet_file is None:
+        return pd.read_csv(csv_path, encoding='utf-8-sig', usecols=columns, dtype=CSV_DTYPES, nrows=nrows)
+
+    if columns is None:
+        columns = default_columns(parquet_file)
+    if nrows is None:
+        return parquet_file.read(columns=columns).to_pandas()
+    batch = next(parquet_file.iter_batches(batch_size=max(nrows, 1), columns=columns), None)
+    if batch is None:
+        return parquet_file.schema_arrow.empty_table().select(columns).to_pandas()
+    return pa.Table.from_batches([batch]).slice(0, nrows).to_pandas()
+
+
+def iter_frames(csv_path, chunk_rows, columns=None):
+    """分块读取CSV表，每块最多chunk_rows行（峰值内存由块大小决定，与表的大小无关）
+
+    有最新的列式文件时按批读取（带类型），否则分块读取CSV（列类型同read_frame，按CSV_DTYPES）。
+    """
+    if columns is not None:
+        columns = list(columns)
+    parquet_file = open_fresh(csv_path)
+    if parquet_file is None:
+        with pd.read_csv(csv_path, encoding='utf-8-sig', usecols=columns, dtype=CSV_DTYPES,
+                         chunksize=chunk_rows) as reader:
+            yield from reader
+        return
+
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns or default_columns(parquet_file)):
+        yield batch.to_pandas()
+
+
+def map_unique(column, func):
+    """对列中每个不同的值只调用一次func（名称、交易方式等列重复值很多），返回object数组"""
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    return np.array([func(value) for value in uniques], dtype=object)[codes]
@@ -0,0 +1,144 @@
+import io
+import os
+import csv
+import json
+from tqdm import tqdm
+
+# 行数元数据文件后缀（与CSV放在同一目录，如 流水总表.csv.meta.json）
+META_SUFFIX = '.meta.json'
+
+# pandas.to_csv默认的行结束符：原先由pandas写出的功能表改为按列写出时沿用
+PANDAS_LINE_TERMINATOR = os.linesep
+
+
+def meta_path(csv_path):
+    """CSV对应的元数据文件路径"""
+    return csv_path + META_SUFFIX
+
+
+def write_row_count(csv_path, rows):
+    """由生成CSV的步骤写入数据行数（记录文件大小用于判断元数据是否过期）"""
+    with open(meta_path(csv_path), 'w', encoding='utf-8') as f:
+        json.dump({'rows': rows, 'size': os.path.getsize(csv_path)}, f)
+
+
+def read_row_count(csv_path):
+    """读取元数据中的数据行数，元数据不存在或已过期时返回None"""
+    try:
+        with open(meta_path(csv_path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('size') == os.path.getsize(csv_path):
+            return meta['rows']
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def count_rows(csv_path):
+    """获取CSV数据行数（不含标题行），优先使用元数据，缺失时统计一次并写入元数据"""
+    rows = read_row_count(csv_path)
+    if rows is None:
+        with open(csv_path, 'r', encoding='utf-8-sig') as f:
+            rows = max(sum(1 for _ in csv.reader(f)) - 1, 0)
+        try:
+            write_row_count(csv_path, rows)
+        except OSError:
+            pass
+    return rows
+
+
+def write_rows(writer, rows):
+    """逐行写入并返回写入的行数"""
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_columns(csv_path, headers, columns, lineterminator='\r\n'):
+    """将按列组织的字符串字段写为完整的CSV（UTF-8 BOM，含标题行），并写入行数元数据"""
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, lineterminator=lineterminator)
+        writer.writerow(headers)
+        writer.writerows(zip(*columns))
+    write_row_count(csv_path, len(columns[0]) if columns else 0)
+
+
+class ColumnsWriter:
+    """分批写入按列组织的字符串字段（输出与一次性write_columns相同），关闭时写入行数元数据
+
+    用法：
+        with ColumnsWriter(csv_path, headers) as writer:
+            for columns in batches:
+                writer.write(columns)
+    """
+
+    def __init__(self, csv_path, headers, lineterminator='\r\n'):
+        self.csv_path = csv_path
+        self.rows = 0
+        self.file = open(csv_path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.file, lineterminator=lineterminator)
+        self.writer.writerow(headers)
+
+    def write(self, columns):
+        if columns and columns[0]:
+            self.writer.writerows(zip(*columns))
+            self.rows += len(columns[0])
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            write_row_count(self.csv_path, self.rows)
+
+    def discard(self):
+        """出错时关闭并删除只写了一部分的CSV（不写行数元数据）"""
+        if not self.file.closed:
+            self.file.close()
+            for path in (self.csv_path, meta_path(self.csv_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class ProgressReader:
+    """按已读取字节数显示进度的CSV读取器，无需预先统计行数
+
+    用法：
+        with ProgressReader(input_file, "整理数据") as reader:
+            headers = reader.headers
+            for row in reader: ...
+    """
+
+    def __init__(self, csv_path, desc, update_interval=1000):
+        self.csv_path = csv_path
+        self.desc = desc
+        self.update_interval = update_interval
+
+    def __enter__(self):
+        self.raw = open(self.csv_path, 'rb')
+        self.text = io.TextIOWrapper(self.raw, encoding='utf-8-sig')
+        self.reader = csv.reader(self.text)
+        self.pbar = tqdm(total=os.path.getsize(self.csv_path), desc=self.desc,
+                         unit='B', unit_scale=True, unit_divisor=1024)
+        self.headers = next(self.reader, [])
+        return self
+
+    def __iter__(self):
+        for i, row in enumerate(self.reader, 1):
+            if i % self.update_interval == 0:
+                self.pbar.update(self.raw.tell() - self.pbar.n)
+            yield row
+        self.pbar.update(self.pbar.total - self.pbar.n)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pbar.close()
+        self.text.close()
@@ -0,0 +1,220 @@
+# processors/detail_parser.py
+"""交易明细解析（步骤3、步骤4和各分析器共用，所有正则预编译）
+
+    normalize_detail  步骤3：清洗原始明细（删除转款方微信号和时间戳、补全空微信名、合并空白）
+    split_detail      步骤4：从清洗后的明细中拆出交易单号和交易方式（split_details为按列处理的版本）
+    parse_parties     分析器：按列提取转账方、收款方和金额文本（流水总表只解析一次，见analyzers.transactions）
+    parse_transfers   单笔转账表：按该表原有的收款方和金额规则按列提取
+"""
+import re
+import numpy as np
+import pandas as pd
+
+TIMESTAMP = r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}'
+
+# 转款方微信号+时间戳；位于开头时（转款方微信名为空）连同其后空白替换为<微信名为空>，否则删除
+SENDER_PATTERN = re.compile(r'(^)?（[^）]+）\s*' + TIMESTAMP + r'(?(1)\s*)')
+EMPTY_PAYEE_PATTERN = re.compile(r'向\s+转账')
+WHITESPACE_PATTERN = re.compile(r'[\s　]+')
+
+# 增强正则模式（匹配所有交易单号/交易方式格式）
+TX_ID_PATTERN = re.compile(r'(\[交易单号：(\d+)\]|交易单号：(\d+))\s*')
+TX_TYPE_PATTERN = re.compile(r'\s*微信(转账|红包)\s*$')
+SPACES_PATTERN = re.compile(r'\s{2,}')
+# 交易单号的值：TX_ID_PATTERN的第一个匹配中的数字即此模式第一个匹配中的数字（以字面量开头，查找更快）
+TX_ID_VALUE_PATTERN = re.compile(r'交易单号：(\d+)')
+TX_TYPES = ('微信转账', '微信红包')
+
+# 按列处理时多条明细以换行符拼接后整体替换，以下模式与上面的单条模式等价但不跨行匹配
+TX_ID_LINE_PATTERN = re.compile(r'(?:\[交易单号：\d+\]|交易单号：\d+)[^\S\n]*')
+# 交易方式前的空白位于行尾，由最后的strip去掉，因此不必匹配
+TX_TYPE_LINE_PATTERN = re.compile(r'微信(?:转账|红包)[^\S\n]*$', re.M)
+SPACES_LINE_PATTERN = re.compile(r'[^\S\n][^\S\n]+')
+
+# 交易双方和金额（只匹配￥后的第一个金额）
+PAYER_PATTERN = re.compile(r'^(.*?)\s+向')
+PAYEE_PATTERN = re.compile(r'向\s*([^转发送]+?)(?:转账|发送|$)')
+AMOUNT_PATTERN = re.compile(r'￥([\d,]+\.?\d*|\d+\.?\d*)')
+
+# 按列解析时使用：每行（以换行符结尾）恰好匹配一次，未找到时分组为空字符串，findall的结果与各行一一对应
+# 转账方分组多包含其后的第一个空白字符，因此找到时分组必不为空（strip后与PAYER_PATTERN的结果一致）
+PAYER_LINE_PATTERN = re.compile(r'^(?:(.*?[^\S\n])[^\S\n]*向)?.*\n', re.M)
+PAYEE_LINE_PATTERN = re.compile(r'^(?:.*?向[^\S\n]*([^转发送\n]+?)(?:转账|发送|$))?.*\n', re.M)
+AMOUNT_LINE_PATTERN = re.compile(r'^(?:.*?￥([\d,]+\.?\d*|\d+\.?\d*))?.*\n', re.M)
+
+# 单笔转账表沿用的规则：收款方不含"红""包"，金额最多两位小数且其后须为"元"、空白或明细结尾
+TRANSFER_PAYEE_PATTERN = re.compile(r'向\s*([^转发送红包]+?)(?:转账|发送|$)')
+TRANSFER_AMOUNT_PATTERN = re.compile(r'￥([\d,]+(?:\.\d{1,2})?)(?:元|\s|$)')
+TRANSFER_PAYEE_LINE_PATTERN = re.compile(r'^(?:.*?向[^\S\n]*([^转发送红包\n]+?)(?:转账|发送|$))?.*\n', re.M)
+TRANSFER_AMOUNT_LINE_PATTERN = re.compile(r'^(?:.*?￥([\d,]+(?:\.\d{1,2})?)(?:元|[^\S\n]|$))?.*\n', re.M)
+
+
+def _replace_sender(match):
+    return '<微信名为空> ' if match.group(1) is not None else ''
+
+
+def normalize_detail(detail):
+    """清洗交易明细（处理微信名为空的情况）"""
+    cleaned = SENDER_PATTERN.sub(_replace_sender, detail)
+    cleaned = EMPTY_PAYEE_PATTERN.sub('向<微信名为空>转账', cleaned)
+    return WHITESPACE_PATTERN.sub(' ', cleaned).strip()
+
+
+def split_detail(detail):
+    """移除交易单号和交易方式，返回 (明细, 交易单号, 交易方式)，未找到的字段为空字符串"""
+    tx_id = ""
+    cleaned = detail
+    tx_id_match = TX_ID_VALUE_PATTERN.search(detail)
+    if tx_id_match:
+        tx_id = tx_id_match.group(1)
+        cleaned = TX_ID_PATTERN.sub('', detail)
+
+    tx_type_match = TX_TYPE_PATTERN.search(detail)
+    tx_type = f"微信{tx_type_match.group(1)}" if tx_type_match else ""
+    if cleaned is not detail:
+        cleaned = TX_TYPE_PATTERN.sub('', cleaned)
+    elif tx_type_match:
+        cleaned = detail[:tx_type_match.start()]
+
+    return SPACES_PATTERN.sub(' ', cleaned).strip(), tx_id, tx_type
+
+
+def split_details(details):
+    """按列拆分多条明细，返回 (明细列表, 交易单号列表, 交易方式列表)，结果与逐条split_detail一致"""
+    if not details:
+        return [], [], []
+    blob = '\n'.join(details)
+    if blob.count('\n') != len(details) - 1:
+        # 明细中含换行符时无法按行拼接，逐条处理
+        return tuple(list(column) for column in zip(*map(split_detail, details)))
+
+    # 交易方式等价于TX_TYPE_PATTERN.search：去掉末尾空白后以"微信转账"/"微信红包"结尾
+    search = TX_ID_VALUE_PATTERN.search
+    tx_ids = [m.group(1) if (m := search(detail)) else "" for detail in details]
+    tx_types = [detail[-4:] if detail.endswith(TX_TYPES)
+                else text[-4:] if (text := detail.rstrip()).endswith(TX_TYPES) else ""
+                for detail in details]
+
+    # 整体移除交易单号和交易方式、合并空白后逐行去掉首尾空白
+    if '交易单号：' in blob:
+        blob = TX_ID_LINE_PATTERN.sub('', blob)
+    blob = TX_TYPE_LINE_PATTERN.sub('', blob)
+    blob = SPACES_LINE_PATTERN.sub(' ', blob)
+    cleaned = [line.strip() for line in blob.split('\n')]
+    return cleaned, tx_ids, tx_types
+
+
+def amount_text(detail):
+    """金额文本（￥后的第一个数字，允许逗号分隔，返回时已去掉逗号）
+
+    没有金额时为空字符串，无法转换为数字（如"￥,"）时为None。
+    """
+    if '，' in detail:
+        detail = detail.replace('，', '')
+    match = AMOUNT_PATTERN.search(detail)
+    if not match:
+        return ''
+    text = match.group(1).replace(',', '')
+    return text if text.strip('.') else None
+
+
+def to_cents(text):
+    """金额文本（元）转换为整数分，超出分的位数四舍五入，空字符串为0"""
+    whole, _, fraction = text.partition('.')
+    cents = int(whole or 0) * 100 + int(fraction[:2].ljust(2, '0'))
+    if fraction[2:] and int(fraction[2]) >= 5:
+        cents += 1
+    return cents
+
+
+def format_cents(cents):
+    """整数分格式化为元，格式与pandas写出浮点数时相同（如3000.0、12.35）"""
+    return repr(int(cents) / 100)
+
+
+def amounts_to_cents(texts):
+    """按列将金额文本转换为整数分（int64数组），每个不同的文本只转换一次，空字符串和None为0"""
+    codes, uniques = pd.factorize(np.array(texts, dtype=object))
+    # 编码-1（None）取到末尾的0
+    values = np.array([to_cents(text) for text in uniques] + [0], dtype=np.int64)
+    return values[codes]
+
+
+def _line_amount_texts(blob):
+    if '，' in blob:
+        blob = blob.replace('，', '')
+    return [text if (text := amount.replace(',', '')).strip('.') else (None if amount else '')
+            for amount in AMOUNT_LINE_PATTERN.findall(blob)]
+
+
+def amount_texts(details):
+    """按列提取金额文本（与逐条amount_text的结果一致）"""
+    blob = '\n'.join(details) + '\n'
+    if blob.count('\n') != len(details):
+        return [amount_text(detail) for detail in details]
+    return _line_amount_texts(blob)
+
+
+def _parse_parties(detail):
+    payer_match = PAYER_PATTERN.search(detail)
+    payee_match = PAYEE_PATTERN.search(detail)
+    return (payer_match.group(1).strip() if payer_match else None,
+            payee_match.group(1).strip() if payee_match else None,
+            amount_text(detail))
+
+
+def parse_parties(details):
+    """按列提取流水总表明细中的转账方、收款方和金额文本
+
+    返回 (转账方列表, 收款方列表, 金额文本列表)：未找到的转账方/收款方为None，
+    金额文本同amount_text（可用amounts_to_cents转换为整数分）。
+    """
+    blob = '\n'.join(details) + '\n'
+    if blob.count('\n') != len(details):
+        # 明细中含换行符时无法按行匹配，逐条处理
+        return tuple(list(column) for column in zip(*map(_parse_parties, details))) or ([], [], [])
+
+    payers = [payer.strip() if payer else None for payer in PAYER_LINE_PATTERN.findall(blob)]
+    payees = [payee.strip() if payee else None for payee in PAYEE_LINE_PATTERN.findall(blob)]
+    return payers, payees, _line_amount_texts(blob)
+
+
+def _transfer_amount_text(detail):
+    match = TRANSFER_AMOUNT_PATTERN.search(detail)
+    return (match.group(1).replace(',', '') or None) if match else ''
+
+
+def transfer_amount_texts(details):
+    """按列提取单笔转账表的金额文本：未找到为空字符串，无法转换为数字（如"￥,"）为None，否则为去掉逗号的文本
+
+    金额其后须为"元"、空白或明细结尾，因此明细首尾的空白不影响结果。
+    """
+    blob = '\n'.join(details) + '\n'
+    if blob.count('\n') != len(details):
+        return [_transfer_amount_text(detail) for detail in details]
+    return [(amount.replace(',', '') or None) if amount else ''
+            for amount in TRANSFER_AMOUNT_LINE_PATTERN.findall(blob)]
+
+
+def _parse_transfer(detail):
+    payer_match = PAYER_PATTERN.search(detail)
+    payee_match = TRANSFER_PAYEE_PATTERN.search(detail)
+    return (payer_match.group(1).strip() if payer_match else None,
+            payee_match.group(1).strip() if payee_match else None)
+
+
+def parse_transfers(details):
+    """按列提取单笔转账表的转账方、收款方和金额文本（details为去掉首尾空白的明细）
+
+    返回值同parse_parties：未找到的转账方/收款方为None，金额文本见transfer_amount_texts。
+    转账方规则与交易总额相同，收款方和金额使用TRANSFER_PAYEE_PATTERN、TRANSFER_AMOUNT_PATTERN。
+    """
+    blob = '\n'.join(details) + '\n'
+    if blob.count('\n') != len(details):
+        # 明细中含换行符时无法按行匹配，逐条处理
+        payers, payees = (list(column) for column in zip(*map(_parse_transfer, details))) if details else ([], [])
+    else:
+        payers = [payer.strip() if payer else None for payer in PAYER_LINE_PATTERN.findall(blob)]
+        payees = [payee.strip() if payee else None for payee in TRANSFER_PAYEE_LINE_PATTERN.findall(blob)]
+    return payers, payees, transfer_amount_texts(details)
+
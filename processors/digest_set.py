@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import hashlib
+import tempfile
+
+# 摘要长度（字节），16字节blake2b的碰撞概率可忽略
+DIGEST_SIZE = 16
+# 内存中最多保存的摘要数，超过后转存到磁盘上的SQLite索引
+SPILL_THRESHOLD = 1000000
+
+
+def digest(*parts):
+    """计算去重键的定长摘要（各部分以\\x00分隔，避免拼接歧义）"""
+    return hashlib.blake2b('\x00'.join(parts).encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+class DigestSet:
+    """内存占用有上限的摘要集合
+
+    摘要数不超过spill_threshold时保存在内存set中，超过后全部写入临时SQLite文件，
+    之后的查询和插入都走磁盘索引。临时文件在close()时删除。
+
+    用法：
+        with DigestSet() as seen:
+            if seen.add(digest(a, b)): ...  # 首次出现
+    """
+
+    def __init__(self, spill_threshold=SPILL_THRESHOLD, spill_dir=None):
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.memory = set()
+        self.conn = None
+        self.path = None
+        self.count = 0
+
+    @property
+    def spilled(self):
+        return self.conn is not None
+
+    def _spill(self):
+        """将内存中的摘要转存到临时SQLite文件"""
+        fd, self.path = tempfile.mkstemp(prefix='dedup_', suffix='.db', dir=self.spill_dir)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('CREATE TABLE digests (digest BLOB PRIMARY KEY) WITHOUT ROWID')
+        self.conn.executemany('INSERT INTO digests VALUES (?)', ((d,) for d in self.memory))
+        self.memory = set()
+
+    def add(self, key):
+        """加入摘要，首次出现返回True，已存在返回False"""
+        if self.conn is None:
+            if key in self.memory:
+                return False
+            self.memory.add(key)
+            self.count += 1
+            if self.count > self.spill_threshold:
+                self._spill()
+            return True
+
+        cursor = self.conn.execute('INSERT OR IGNORE INTO digests VALUES (?)', (key,))
+        if cursor.rowcount == 1:
+            self.count += 1
+            return True
+        return False
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """释放内存并删除临时文件"""
+        self.memory = set()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
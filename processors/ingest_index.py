@@ -0,0 +1,81 @@
+import sqlite3
+from processors.digest_set import digest
+from processors.step4_simplify import EMPTY_VALUE
+
+# 跨上传去重索引文件名（放在报告的数据库目录下，每个报告一个，与报告数据库和汇总状态一致）：
+# 只对同名报告的重复上传去重，以其他名称上传的报告有自己的数据库和索引，导入全部交易
+INDEX_FILE_NAME = 'ingest_index.db'
+
+
+def transaction_key(row):
+    """流水总表一行的去重键：交易单号+规范化明细（无交易单号时以时间代替）"""
+    detail = ' '.join(row[6].split())
+    tx_id = row[7]
+    if tx_id and tx_id != EMPTY_VALUE:
+        return digest(tx_id, detail)
+    return digest(row[0], detail)
+
+
+class IngestIndex:
+    """持久化的跨上传去重索引，按检材（微信号列）分别记录一个报告已导入的交易
+
+    同一笔交易出现在报告中多个检材的流水里时（如两个检材之间的转账），各检材分别保留。
+
+    filter_new只输出索引中没有的交易，新交易先暂存在内存中，
+    整个任务（含数据库导入）成功后调用commit()才写入索引，失败时直接close()即可。
+
+    用法：
+        index = IngestIndex(index_path)
+        try:
+            rows = index.filter_new(rows)
+            ...
+            index.commit()
+        finally:
+            index.close()
+    """
+
+    def __init__(self, index_path):
+        self.conn = sqlite3.connect(index_path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS seen (
+                subject TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                PRIMARY KEY (subject, digest)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+        self.pending = set()
+        self.new = 0
+        self.existing = 0
+
+    def reset(self):
+        """清空索引（报告数据库不存在、需要重新全部导入时调用），与新交易一同在commit()时生效"""
+        self.conn.execute('DELETE FROM seen')
+
+    def contains(self, subject, key):
+        return self.conn.execute('SELECT 1 FROM seen WHERE subject = ? AND digest = ?',
+                                 (subject, key)).fetchone() is not None
+
+    def filter_new(self, rows):
+        """过滤流水总表记录，只生成此前上传中未出现过的交易"""
+        for row in rows:
+            entry = (row[3], transaction_key(row))
+            if entry in self.pending:
+                continue
+            if self.contains(*entry):
+                self.existing += 1
+                continue
+            self.pending.add(entry)
+            self.new += 1
+            yield row
+
+    def commit(self):
+        """将本次的新交易写入索引"""
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO seen VALUES (?, ?)', self.pending)
+        self.pending.clear()
+
+    def close(self):
+        self.pending.clear()
+        self.conn.close()
@@ -0,0 +1,71 @@
+import os
+import csv
+from processors import step1_extract, step2_organize, step3_deduplicate, step4_simplify
+from processors.csv_meta import write_row_count
+from processors.columnar import ColumnarWriter
+
+# 调试模式下写出的中间文件（与逐步处理时的文件名一致）
+STEP1_FILE = "step1_basic_transactions.csv"
+STEP2_FILE = "step2_organized_transactions.csv"
+STEP3_FILE = "step3_deduplicated_transactions.csv"
+
+
+def tee_csv(rows, output_file, headers):
+    """将经过的记录同时写入CSV（用于输出中间文件）"""
+    count = 0
+    with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            yield row
+
+    write_row_count(output_file, count)
+
+
+def run(input_dir, output_file, debug_dir=None, index=None, **step1_options):
+    """融合流水线：步骤1→4以生成器串联，只写出最终的流水总表
+
+    流水总表旁同时写出列式文件（见columnar）。指定debug_dir时额外写出步骤1~3的中间CSV；指定index（IngestIndex）时流水总表只包含
+    此前上传中未出现过的交易。step1_options传给步骤1的iter_records，
+    返回步骤1的统计信息（另含最终记录数total）。
+    """
+    stats = {}
+    cache_start = step2_organize.parse_header.cache_info()
+    rows = step1_extract.iter_records(input_dir, stats=stats, **step1_options)
+    if debug_dir:
+        rows = tee_csv(rows, os.path.join(debug_dir, STEP1_FILE), step1_extract.HEADERS)
+
+    rows = step2_organize.organize_batches(rows)
+    if debug_dir:
+        rows = tee_csv(rows, os.path.join(debug_dir, STEP2_FILE), step2_organize.HEADERS)
+
+    rows = step3_deduplicate.deduplicate(rows)
+    if debug_dir:
+        rows = tee_csv(rows, os.path.join(debug_dir, STEP3_FILE), step2_organize.HEADERS)
+
+    rows = step4_simplify.simplify_batches(rows)
+    if index is not None:
+        rows = index.filter_new(rows)
+
+    # 流水总表同时写出带类型的列式文件（CSV先关闭，列式文件后替换，保证其不早于CSV）
+    headers = step2_organize.HEADERS + step4_simplify.EXTRA_HEADERS
+    total = 0
+    with ColumnarWriter(output_file, headers) as table, \
+            open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for batch in step2_organize.iter_batches(rows, step4_simplify.BATCH_SIZE):
+            writer.writerows(batch)
+            table.write_rows(batch)
+            total += len(batch)
+
+    write_row_count(output_file, total)
+    stats['total'] = total
+    if index is not None:
+        stats['existing'] = index.existing
+        print(f"跨上传去重：新增 {index.new} 条，已存在 {index.existing} 条")
+    print(f"流水总表生成完成，共 {total} 条记录")
+    step2_organize.log_header_cache(cache_start)
+    return stats
@@ -2,10 +2,66 @@ import os
 import re
 import csv
 import glob
+import json
+import sqlite3
+import hashlib
+import mmap
+import zipfile
+import posixpath
 import multiprocessing
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 from functools import partial
+from collections import OrderedDict
+from processors.worker_pool import iter_ordered
+from processors.csv_meta import write_row_count
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# lxml引擎使用的预编译XPath：只定位含"流水记录"的标题及其后第一个div
+if etree is not None:
+    HEADING_XPATH = etree.XPath(
+        "//*[self::h1 or self::h2 or self::h3 or self::h4 or self::h5 or self::h6]"
+        "[contains(., '流水记录')]"
+    )
+    # 与BeautifulSoup的find_next('div')一致：先找标题内部，再找其后的div
+    NEXT_DIV_XPATH = etree.XPath("(descendant::div | following::div)[1]")
+
+# BeautifulSoup的get_text不会输出这些标签内的文本
+SKIPPED_TEXT_TAGS = {'script', 'style', 'template'}
+
+# 提取规则版本号，修改提取逻辑后需递增，使旧缓存失效
+EXTRACTOR_VERSION = 1
+CACHE_FILE_NAME = 'step1_cache.db'
+CACHE_COMMIT_INTERVAL = 500
+
+# 每个多进程任务包含的页面数，以及按顺序写出前最多暂存的任务数
+IMAP_CHUNKSIZE = 8
+REORDER_BUFFER_SIZE = 64
+
+# 输出列
+HEADERS = ['来源文件', '标题', '原始内容']
+
+# 页面预筛选关键字：原始字节中不含该关键字的页面不会交给HTML解析器
+KEYWORD_BYTES = '流水记录'.encode('utf-8')
+
+# 提取状态
+STATUS_PARSED = 'parsed'
+STATUS_CACHED = 'cached'
+STATUS_SKIPPED = 'skipped'
+
+# 页面文件名格式，以及ZIP中可直接读取的压缩方式
+PAGE_PATTERN = re.compile(r'page(\d+)\.html')
+ZIP_SUPPORTED_COMPRESSION = {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA}
+
+# 工作进程内复用的只读缓存连接和ZIP句柄（共享进程池长期存在，只保留最近使用的几个）：
+# 路径→(文件标识, 句柄)，同名文件被替换或改写（如同名报告重新上传）后重新打开
+MAX_OPEN_HANDLES = 4
+_cache_connections = OrderedDict()
+_zip_files = OrderedDict()
 
 
 def get_parser():
@@ -21,72 +77,329 @@ def get_parser():
             return 'html.parser'
 
 
-def process_single_file(file_path, parser):
-    """处理单个HTML文件"""
+def get_engine():
+    """获取可用的提取引擎（优先lxml XPath，否则回退到BeautifulSoup）"""
+    return 'lxml' if etree is not None else 'bs4'
+
+
+def iter_strings(element, is_root=True):
+    """按文档顺序输出元素内的文本片段（跳过注释和script/style/template，与get_text一致）"""
+    if isinstance(element.tag, str) and element.tag not in SKIPPED_TEXT_TAGS:
+        if element.text:
+            yield element.text
+        for child in element:
+            yield from iter_strings(child, is_root=False)
+    if not is_root and element.tail:
+        yield element.tail
+
+
+def extract_with_lxml(text):
+    """使用lxml预编译XPath提取流水记录（标题, 内容）
+
+    以UTF-8字节交给解析器：lxml不接受带编码声明（<?xml ... encoding=...?>）的str，
+    页面已按UTF-8解码，编码声明不影响结果（与BeautifulSoup一致）。
+    """
+    root = etree.fromstring(text.encode('utf-8'), etree.HTMLParser(encoding='utf-8')) if text.strip() else None
+    if root is None:
+        return []
+
+    records = []
+    for h_tag in HEADING_XPATH(root):
+        if '流水记录' not in ''.join(iter_strings(h_tag)):
+            continue
+        div_tags = NEXT_DIV_XPATH(h_tag)
+        if div_tags:
+            header = re.sub(r'\s+', ' ', ''.join(s.strip() for s in iter_strings(h_tag)))
+            content = ' '.join(s for s in (s.strip() for s in iter_strings(div_tags[0])) if s)
+            records.append((header, content))
+    return records
+
+
+def extract_with_bs4(text, parser):
+    """使用BeautifulSoup提取流水记录（标题, 内容）"""
+    soup = BeautifulSoup(text, parser)
+    records = []
+
+    for h_tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        if '流水记录' in h_tag.get_text():
+            div_tag = h_tag.find_next('div')
+            if div_tag:
+                header = re.sub(r'\s+', ' ', h_tag.get_text(strip=True))
+                content = div_tag.get_text(strip=True, separator=' ')
+                records.append((header, content))
+    return records
+
+
+class PageCache:
+    """页面提取结果缓存（按页面内容哈希 + 提取规则版本索引）"""
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.conn = sqlite3.connect(cache_path)
+        # WAL模式下工作进程可以在主进程写入时并发读取
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'digest TEXT NOT NULL, version INTEGER NOT NULL, records TEXT NOT NULL, '
+            'PRIMARY KEY (digest, version))'
+        )
+        self.conn.commit()
+        self.pending = []
+
+    def put(self, digest, records):
+        self.pending.append((digest, EXTRACTOR_VERSION, json.dumps(records, ensure_ascii=False)))
+        if len(self.pending) >= CACHE_COMMIT_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?)', self.pending)
+            self.conn.commit()
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def file_signature(path):
+    """文件标识：inode、大小和修改时间，任一变化即视为不同的文件"""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def get_handle(handles, path, opener):
+    """获取工作进程内复用的句柄，超出MAX_OPEN_HANDLES时关闭最久未使用的句柄
+
+    文件标识与打开时不同（文件已被替换或改写）时关闭旧句柄并重新打开。
+    """
+    signature = file_signature(path)
+    entry = handles.get(path)
+    if entry is not None and entry[0] != signature:
+        handles.pop(path)[1].close()
+        entry = None
+    if entry is None:
+        entry = handles[path] = (signature, opener())
+        while len(handles) > MAX_OPEN_HANDLES:
+            handles.popitem(last=False)[1][1].close()
+    else:
+        handles.move_to_end(path)
+    return entry[1]
+
+
+def lookup_cache(cache_path, digest):
+    """在工作进程中查询缓存，未命中返回None"""
+    conn = get_handle(_cache_connections, cache_path,
+                      lambda: sqlite3.connect(f'file:{cache_path}?mode=ro', uri=True))
+    row = conn.execute(
+        'SELECT records FROM pages WHERE digest = ? AND version = ?',
+        (digest, EXTRACTOR_VERSION)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def find_zip_pages(zf):
+    """在ZIP中查找报告页面成员（跳过resfile），返回按页码排序的ZipInfo列表"""
+    groups = {}
+    for info in zf.infolist():
+        parts = info.filename.split('/')
+        if info.is_dir() or 'resfile' in parts[:-1]:
+            continue
+        match = PAGE_PATTERN.fullmatch(parts[-1])
+        if match:
+            groups.setdefault(posixpath.dirname(info.filename), []).append((int(match.group(1)), info))
+    if not groups:
+        return []
+
+    # 优先使用 "-files" 目录，与解压后选择输入目录的规则一致
+    page_dir = next((d for d in groups if '-files' in posixpath.basename(d)), next(iter(groups)))
+    return [info for _, info in sorted(groups[page_dir], key=lambda x: x[0])]
+
+
+def can_read_zip(zip_path):
+    """判断能否直接从ZIP读取报告页面（存在页面且未加密、压缩方式受支持）"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, parser)
-            file_results = []
-
-            for h_tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                if '流水记录' in h_tag.get_text():
-                    div_tag = h_tag.find_next('div')
-                    if div_tag:
-                        header = re.sub(r'\s+', ' ', h_tag.get_text(strip=True))
-                        content = div_tag.get_text(strip=True, separator=' ')
-                        file_results.append([
-                            os.path.basename(file_path),
-                            header,
-                            content
-                        ])
-            return file_results
+        with zipfile.ZipFile(zip_path) as zf:
+            infos = find_zip_pages(zf)
+    except (zipfile.BadZipFile, OSError):
+        return False
+    return bool(infos) and all(
+        info.compress_type in ZIP_SUPPORTED_COMPRESSION and not info.flag_bits & 0x1
+        for info in infos
+    )
+
+
+def list_pages(input_path):
+    """列出待处理页面：目录中的文件路径，或ZIP中的 (ZIP路径, 成员名)，按页码排序"""
+    if os.path.isdir(input_path):
+        html_files = glob.glob(os.path.join(input_path, 'page*.html'))
+        html_files.sort(key=lambda x: int(re.search(r'page(\d+)\.html', x).group(1)))
+        return html_files
+
+    with zipfile.ZipFile(input_path) as zf:
+        return [(input_path, info.filename) for info in find_zip_pages(zf)]
+
+
+def page_name(page):
+    """页面文件名（写入"来源文件"列）"""
+    if isinstance(page, tuple):
+        return posixpath.basename(page[1])
+    return os.path.basename(page)
+
+
+def read_page(page, keyword=None):
+    """读取页面原始字节，ZIP成员直接从压缩包中读取
+
+    指定keyword时先在原始字节中查找关键字，不含关键字的页面返回None；
+    磁盘文件通过mmap查找，跳过的页面不会被完整读入内存。
+    """
+    if isinstance(page, tuple):
+        zip_path, member = page
+        zf = get_handle(_zip_files, zip_path, lambda: zipfile.ZipFile(zip_path))
+        data = zf.read(member)
+        return data if keyword is None or keyword in data else None
+
+    with open(page, 'rb') as f:
+        if keyword is None:
+            return f.read()
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:] if mm.find(keyword) != -1 else None
+
+
+def decode_page(data):
+    """按文本模式读取的规则解码页面（UTF-8，统一换行符）"""
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def extract_page(page, parser, engine='bs4', cache_path=None, prefilter=True):
+    """处理单个页面，返回 (内容哈希, 提取记录, 提取状态)，出错时记录为None"""
+    try:
+        data = read_page(page, KEYWORD_BYTES if prefilter else None)
+        if data is None:
+            return None, [], STATUS_SKIPPED
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+
+        if cache_path:
+            records = lookup_cache(cache_path, digest)
+            if records is not None:
+                return digest, records, STATUS_CACHED
+
+        text = decode_page(data)
+        records = None
+        if engine == 'lxml':
+            try:
+                records = extract_with_lxml(text)
+            except Exception as e:
+                # lxml无法处理的页面改用BeautifulSoup提取，不丢弃该页面
+                print(f"lxml提取页面 {page_name(page)} 失败，改用BeautifulSoup: {str(e)}")
+        if records is None:
+            records = extract_with_bs4(text, parser)
+        return digest, [list(record) for record in records], STATUS_PARSED
     except Exception as e:
+        file_path = os.path.join(*page) if isinstance(page, tuple) else page
         print(f"处理文件 {file_path} 时出错: {str(e)}")
-        return []
+        return None, None, STATUS_PARSED
+
 
+def process_single_file(file_path, parser, engine='bs4'):
+    """处理单个HTML文件"""
+    _, records, _ = extract_page(file_path, parser, engine)
+    file_name = page_name(file_path)
+    return [[file_name, header, content] for header, content in records or []]
+
+
+def iter_records(input_dir, stats=None, engine=None, cache_dir=None,
+                 chunksize=IMAP_CHUNKSIZE, buffer_size=REORDER_BUFFER_SIZE, prefilter=True, pool=None):
+    """按页码顺序逐条生成 [来源文件, 标题, 原始内容]
+
+    input_dir可以是页面目录或报告ZIP；指定cache_dir时启用页面结果缓存；
+    pool为共享进程池（worker_pool.SharedPool）时提交到该进程池，否则临时创建进程池。
+    stats字典中会写入页面数、记录数、预筛选跳过的页面数、缓存命中数。
+    """
+    stats = stats if stats is not None else {}
+    stats.update(pages=0, records=0, skipped=0, cache_hits=0)
 
-def process(input_dir, output_file):
-    """主处理函数"""
+    engine = engine or get_engine()
     parser = get_parser()
-    print(f"使用的HTML解析器: {parser}")
+    if engine == 'lxml':
+        print("使用的提取引擎: lxml XPath")
+    else:
+        print(f"使用的提取引擎: BeautifulSoup，HTML解析器: {parser}")
     if parser == 'html.parser':
         print("警告: 建议安装lxml以获得更好性能 (pip install lxml)")
 
     # 获取并排序文件列表
-    html_files = glob.glob(os.path.join(input_dir, 'page*.html'))
-    html_files.sort(key=lambda x: int(re.search(r'page(\d+)\.html', x).group(1)))
+    html_files = list_pages(input_dir)
     total_files = len(html_files)
+    stats['pages'] = total_files
 
     if not html_files:
         print("未找到匹配的HTML文件")
         return
 
+    # 打开页面缓存（工作进程只读访问，主进程负责写入）
+    cache = None
+    cache_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, CACHE_FILE_NAME)
+        cache = PageCache(cache_path)
+
     # 初始化进度条（放在这里确保只创建一次）
     pbar = tqdm(total=total_files, desc="解析进度", unit="文件")
 
-    # 多进程处理
-    results = []
-    with multiprocessing.Pool(processes=multiprocessing.cpu_count()) as pool:
-        # 使用imap按顺序处理文件
-        for file_result in pool.imap(
-                partial(process_single_file, parser=parser),
-                html_files
-        ):
-            if file_result:
-                results.extend(file_result)
+    # 多进程处理，结果按页码顺序输出
+    worker = partial(extract_page, parser=parser, engine=engine,
+                     cache_path=cache_path, prefilter=prefilter)
+    local_pool = None
+    if pool is not None:
+        ordered_results = pool.iter_ordered(worker, html_files, chunksize=chunksize, buffer_size=buffer_size)
+    else:
+        local_pool = multiprocessing.Pool(processes=multiprocessing.cpu_count())
+        ordered_results = iter_ordered(local_pool, worker, html_files, chunksize=chunksize, buffer_size=buffer_size)
+
+    try:
+        for file_path, (digest, records, status) in ordered_results:
+            if status == STATUS_SKIPPED:
+                stats['skipped'] += 1
+            elif status == STATUS_CACHED:
+                stats['cache_hits'] += 1
+            elif cache and records is not None:
+                cache.put(digest, records)
+            if records:
+                file_name = page_name(file_path)
+                for header, content in records:
+                    yield [file_name, header, content]
+                stats['records'] += len(records)
             pbar.update(1)  # 每个文件处理完更新一次进度
+    finally:
+        ordered_results.close()
+        pbar.close()  # 确保进度条关闭
+        if local_pool is not None:
+            local_pool.terminate()
+        if cache:
+            cache.close()
 
-    pbar.close()  # 确保进度条关闭
+    print(f"处理完成！共处理 {total_files} 个文件，生成 {stats['records']} 条记录")
+    if prefilter:
+        print(f"预筛选跳过 {stats['skipped']} 个不含流水记录的页面")
+    if cache:
+        print(f"页面缓存命中 {stats['cache_hits']} 个，"
+              f"重新解析 {total_files - stats['skipped'] - stats['cache_hits']} 个")
 
-    # 按原始文件顺序排序结果（imap已保持顺序，此步可省略）
-    results.sort(key=lambda x: int(re.search(r'page(\d+)\.html', x[0]).group(1)))
 
-    # 写入CSV
+def process(input_dir, output_file, **options):
+    """主处理函数，参数见iter_records，返回统计信息"""
+    stats = {}
     with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['来源文件', '标题', '原始内容'])
-        writer.writerows(results)
-    print(f"处理完成！共处理 {total_files} 个文件，生成 {len(results)} 条记录")
+        writer.writerow(HEADERS)
+        writer.writerows(iter_records(input_dir, stats=stats, **options))
+
+    write_row_count(output_file, stats['records'])
+    return stats
 
 
 if __name__ == '__main__':
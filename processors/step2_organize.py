@@ -1,69 +1,189 @@
+import io
 import csv
 import re
+from functools import lru_cache
+from itertools import islice, chain
+import numpy as np
+import pandas as pd
 from tqdm import tqdm
+from processors.csv_meta import ProgressReader, write_rows, write_row_count, read_row_count
 
 # 预编译正则表达式
 HEADER_PATTERN = re.compile(
     r"(.+?)/(微信(?:\(分身版\))?)/(.+?)\((.+?)\)/流水记录/(.+?)(?:\((\d+)\))?$"
 )
 TRANSACTION_PATTERN = re.compile(r'(?<=微信转账)\s+|(?<=微信红包)\s+')
+TIME_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+# "微信转账"/"微信红包"后紧跟非空白字符时不应拆分
+SPLIT_GUARD_PATTERN = re.compile(r'微信(?:转账|红包)(?![\s\x01]|\Z)')
 
+# 批量引擎每批处理的步骤1记录数
+BATCH_SIZE = 20000
 
-def process(input_file, output_file):
-    """整理并规范化交易数据"""
-    with open(input_file, 'r', encoding='utf-8-sig') as f_in, \
-            open(output_file, 'w', encoding='utf-8-sig', newline='') as f_out:
+# 标题解析结果缓存的最大条目数（同一页面的记录共用少量标题）
+HEADER_CACHE_SIZE = 4096
 
-        reader = csv.reader(f_in)
-        next(reader)  # 跳过标题行
-        writer = csv.writer(f_out)
-        writer.writerow(["时间", "平台", "检材微信名", "微信号", "对方微信名", "对方微信号", "交易明细"])
+# 输出列
+HEADERS = ["时间", "平台", "检材微信名", "微信号", "对方微信名", "对方微信号", "交易明细"]
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def parse_header(header):
+    """解析流水记录标题，返回 (平台, 检材微信名, 微信号, 对方微信名, 对方微信号)，无法解析时返回None
+
+    结果按标题缓存（LRU），返回值为元组，调用方不可修改。缺失的标题（None/NaN）视为无法解析。
+    """
+    if not isinstance(header, str):
+        return None
+    header_match = HEADER_PATTERN.match(header)
+    if not header_match:
+        return None
+
+    # 提取基础信息
+    platform = header_match.group(2)
+    self_name = header_match.group(3).strip()
+    self_id = header_match.group(4).strip()
+    target_part = header_match.group(5).strip()
+
+    # 解析对方信息
+    target_name, target_id = parse_target_info(target_part)
+    return platform, self_name, self_id, target_name, target_id
+
+
+def log_header_cache(start):
+    """输出自start（parse_header.cache_info()快照）以来的标题缓存命中情况"""
+    info = parse_header.cache_info()
+    print(f"标题解析缓存：命中 {info.hits - start.hits} 次，未命中 {info.misses - start.misses} 次，"
+          f"当前缓存 {info.currsize}/{info.maxsize} 条")
 
-        # 进度条设置
-        total_lines = sum(1 for _ in open(input_file, encoding='utf-8-sig'))
-        progress = tqdm(total=total_lines - 1, desc="整理数据", unit="条")
 
-        for row in reader:
-            progress.update(1)
-            if len(row) < 3:
+def organize(rows):
+    """按交易拆分步骤1的记录并规范化（逐条生成）"""
+    for row in rows:
+        if len(row) < 3:
+            continue
+
+        # 解析标题信息
+        header_info = parse_header(row[1])
+        if not header_info:
+            continue
+
+        # 分割交易记录（缺失的内容视为空）
+        transactions = TRANSACTION_PATTERN.split(row[2] if isinstance(row[2], str) else '')
+
+        for tx in transactions:
+            tx = tx.strip()
+            if not tx:
                 continue
 
-            # 解析标题信息
-            header_match = HEADER_PATTERN.match(row[1])
-            if not header_match:
+            # 提取时间戳
+            time_match = TIME_PATTERN.search(tx)
+            if not time_match:
                 continue
 
-            # 提取基础信息
-            platform = header_match.group(2)
-            self_name = header_match.group(3).strip()
-            self_id = header_match.group(4).strip()
-            target_part = header_match.group(5).strip()
-
-            # 解析对方信息
-            target_name, target_id = parse_target_info(target_part)
-
-            # 分割交易记录
-            transactions = TRANSACTION_PATTERN.split(row[2])
-
-            for tx in transactions:
-                tx = tx.strip()
-                if not tx:
-                    continue
-
-                # 提取时间戳
-                time_match = re.search(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", tx)
-                if not time_match:
-                    continue
-
-                writer.writerow([
-                    time_match.group(),
-                    platform,
-                    self_name,
-                    self_id,
-                    target_name,
-                    target_id,
-                    tx
-                ])
+            yield [time_match.group(), *header_info, tx]
+
+
+def split_transactions(contents):
+    """批量拆分交易记录，各段strip并去掉空段后与逐条TRANSACTION_PATTERN.split的结果一致
+
+    整批内容拼接后按"微信转账"/"微信红包"做字符串切分，避免正则在每个位置上
+    尝试后行断言；存在其后紧跟非空白字符的情况时回退到逐条正则拆分。
+    """
+    blob = '\x01'.join(contents)
+    if '\x00' in blob or blob.count('\x01') != len(contents) - 1 or SPLIT_GUARD_PATTERN.search(blob):
+        return [TRANSACTION_PATTERN.split(content) for content in contents]
+
+    blob = blob.replace('微信转账', '微信转账\x00').replace('微信红包', '微信红包\x00')
+    return [content.split('\x00') for content in blob.split('\x01')]
+
+
+def organize_frame(df):
+    """批量整理一批步骤1记录（列顺序：来源文件, 标题, 原始内容）
+
+    标题只对去重后的取值解析一次，交易按数组展开，时间戳以列为单位提取，
+    结果与organize逐条生成的一致。
+    """
+    # 缺失的标题单独编码（不使用-1，否则会取到最后一个标题），由parse_header判定为无法解析
+    codes, headers = pd.factorize(df.iloc[:, 1].to_numpy(dtype=object), use_na_sentinel=False)
+    header_table = np.empty((len(headers), 5), dtype=object)
+    valid = np.zeros(len(headers), dtype=bool)
+    for i, header in enumerate(headers):
+        header_info = parse_header(header)
+        if header_info:
+            header_table[i] = header_info
+            valid[i] = True
+
+    row_mask = valid[codes]
+    if not row_mask.any():
+        return pd.DataFrame(columns=HEADERS, dtype=object)
+    codes = codes[row_mask]
+
+    # 分割交易记录并展开，每笔交易一行
+    contents = df.iloc[:, 2].to_numpy(dtype=object)[row_mask]
+    pieces = split_transactions([content if isinstance(content, str) else '' for content in contents])
+    counts = np.fromiter(map(len, pieces), dtype=np.int64, count=len(pieces))
+    transactions = np.array([tx.strip() for tx in chain.from_iterable(pieces)], dtype=object)
+    tx_codes = np.repeat(codes, counts)
+
+    # 提取时间戳（空记录和无时间戳的记录被过滤）
+    search = TIME_PATTERN.search
+    times = np.array([m.group() if (m := search(tx)) else None for tx in transactions], dtype=object)
+    keep = pd.notna(times)
+
+    values = np.column_stack((times[keep], header_table[tx_codes[keep]], transactions[keep]))
+    return pd.DataFrame(values, columns=HEADERS, dtype=object)
+
+
+def iter_batches(rows, batch_size):
+    """将记录按批次分组"""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def organize_batches(rows, batch_size=BATCH_SIZE):
+    """批量引擎版organize：分批整理后逐条生成"""
+    for batch in iter_batches(rows, batch_size):
+        df = pd.DataFrame([row[:3] for row in batch if len(row) >= 3],
+                          columns=['来源文件', '标题', '原始内容'], dtype=object)
+        yield from organize_frame(df).values.tolist()
+
+
+def process(input_file, output_file, engine='batch', batch_size=BATCH_SIZE):
+    """整理并规范化交易数据（engine='row'时使用逐条处理）"""
+    cache_start = parse_header.cache_info()
+    if engine == 'row':
+        with ProgressReader(input_file, "整理数据") as reader, \
+                open(output_file, 'w', encoding='utf-8-sig', newline='') as f_out:
+            writer = csv.writer(f_out)
+            writer.writerow(HEADERS)
+            rows = write_rows(writer, organize(reader))
+        write_row_count(output_file, rows)
+        log_header_cache(cache_start)
+        return
+
+    rows = 0
+    progress = tqdm(total=read_row_count(input_file), desc="整理数据", unit="条")
+    with open(output_file, 'w', encoding='utf-8-sig', newline='') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(HEADERS)
+        for chunk in pd.read_csv(input_file, encoding='utf-8-sig', dtype=object, keep_default_na=False,
+                                 usecols=[0, 1, 2], chunksize=batch_size):
+            result = organize_frame(chunk)
+            # 整批格式化后一次写入，减少逐行写文件和编码的开销
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(result.values.tolist())
+            f_out.write(buffer.getvalue())
+            rows += len(result)
+            progress.update(len(chunk))
+    progress.close()
+
+    write_row_count(output_file, rows)
+    log_header_cache(cache_start)
 
 
 def parse_target_info(target_part):
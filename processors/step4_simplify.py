@@ -1,61 +1,118 @@
 # processors/step4_simplify.py
 import csv
 import re
+import pandas as pd
 from tqdm import tqdm
+from processors.csv_meta import ProgressReader, write_rows, write_row_count, read_row_count
+from processors.detail_parser import split_detail, split_details
+from processors.columnar import ColumnarWriter
+from processors.step2_organize import iter_batches
 
+# 在输入列之后追加的列
+EXTRA_HEADERS = ["交易单号", "交易方式"]
 
-def process(input_file, output_file):
-    """生成最终流水总表（完全清理交易明细）"""
-    with open(input_file, 'r', encoding='utf-8-sig') as f_in, \
-            open(output_file, 'w', encoding='utf-8-sig', newline='') as f_out:
+# 空缺值的填充内容
+EMPTY_VALUE = "<空缺>"
 
-        reader = csv.reader(f_in)
-        headers = next(reader) + ["交易单号", "交易方式"]
-        writer = csv.writer(f_out)
-        writer.writerow(headers)
+# 列值以换行符拼接后，用于快速判断列中是否存在空值或只含空白的值
+BLANK_LINE_PATTERN = re.compile(r'^[^\S\n]*$', re.M)
+
+# 批量引擎每批处理的记录数
+BATCH_SIZE = 50000
+
+
+def simplify(rows):
+    """完全清理交易明细并提取交易单号/交易方式（逐条生成）"""
+    for row in rows:
+        # 清理交易明细并提取交易单号/交易方式
+        cleaned_detail, tx_id, tx_type = split_detail(row[6])
+
+        # 更新明细列
+        row[6] = cleaned_detail
+
+        # 填充所有空缺值为<空缺>
+        processed_row = []
+        for cell in row + [tx_id, tx_type]:
+            if cell == "" or cell is None or (isinstance(cell, str) and cell.strip() == ""):
+                processed_row.append(EMPTY_VALUE)
+            else:
+                processed_row.append(cell)
 
-        # 增强正则模式（匹配所有交易单号/交易方式格式）
-        tx_id_pattern = re.compile(r'(\[交易单号：(\d+)\]|交易单号：(\d+))\s*')
-        tx_type_pattern = re.compile(r'\s*微信(转账|红包)\s*$')
+        yield processed_row
 
-        # 进度条支持
-        total_lines = sum(1 for _ in open(input_file, encoding='utf-8-sig'))
-        pbar = tqdm(total=total_lines - 1, desc="生成总表", unit="条")
 
-        for row in reader:
-            pbar.update(1)
-            original_detail = row[6]
+def fill_empty(column):
+    """将一列中的空值（空字符串或只含空白）替换为<空缺>"""
+    if BLANK_LINE_PATTERN.search('\n'.join(column)) is None:
+        return column
+    return [cell if cell and not cell.isspace() else EMPTY_VALUE for cell in column]
 
-            # 提取交易信息
-            tx_id_match = tx_id_pattern.search(original_detail)
-            tx_type_match = tx_type_pattern.search(original_detail)
 
-            # 清理交易明细（关键修改点）
-            cleaned_detail = tx_id_pattern.sub('', original_detail)  # 移除交易单号
-            cleaned_detail = tx_type_pattern.sub('', cleaned_detail)  # 移除交易类型
-            cleaned_detail = re.sub(r'\s{2,}', ' ', cleaned_detail).strip()  # 清理多余空格
+def simplify_columns(columns):
+    """批量版simplify：columns为步骤3输出的各列，按列清理明细、提取交易单号/交易方式并填充空缺值
 
-            # 获取提取值
-            tx_id = ""
-            if tx_id_match:
-                tx_id = tx_id_match.group(2) or tx_id_match.group(3)  # 匹配两种格式
+    返回流水总表的各列，结果与simplify逐条生成的一致。
+    """
+    details, tx_ids, tx_types = split_details(columns[6])
+    columns = [fill_empty(column) for column in columns[:6] + columns[7:]]
+    # 明细已去掉首尾空白、交易单号只含数字、交易方式为固定值，只需填充空字符串
+    details, tx_ids, tx_types = ([value or EMPTY_VALUE for value in column]
+                                 for column in (details, tx_ids, tx_types))
+    return columns[:6] + [details] + columns[6:] + [tx_ids, tx_types]
 
-            tx_type = f"微信{tx_type_match.group(1)}" if tx_type_match else ""
 
-            # 更新明细列
-            row[6] = cleaned_detail
+def simplify_batches(rows, batch_size=BATCH_SIZE):
+    """批量引擎版simplify：分批按列处理后逐条生成"""
+    for batch in iter_batches(rows, batch_size):
+        widths = set(map(len, batch))
+        if len(widths) != 1 or min(widths) < 7:
+            # 列数不一致时逐条处理
+            yield from simplify(batch)
+            continue
+        columns = [list(column) for column in zip(*batch)]
+        yield from map(list, zip(*simplify_columns(columns)))
 
-            # 填充所有空缺值为<空缺>
-            processed_row = []
-            for cell in row + [tx_id, tx_type]:
-                if cell == "" or cell is None or (isinstance(cell, str) and cell.strip() == ""):
-                    processed_row.append("<空缺>")
-                else:
-                    processed_row.append(cell)
 
-            writer.writerow(processed_row)
+def process(input_file, output_file, index=None, engine='batch', batch_size=BATCH_SIZE):
+    """生成最终流水总表（完全清理交易明细，engine='row'时使用逐条处理，不写出列式文件）
+
+    指定index（IngestIndex）时只输出此前上传中未出现过的交易。
+    """
+    if engine == 'row':
+        with ProgressReader(input_file, "生成总表") as reader, \
+                open(output_file, 'w', encoding='utf-8-sig', newline='') as f_out:
+            writer = csv.writer(f_out)
+            writer.writerow(reader.headers + EXTRA_HEADERS)
+            rows = simplify(reader)
+            if index is not None:
+                rows = index.filter_new(rows)
+            rows = write_rows(writer, rows)
+        write_row_count(output_file, rows)
+        return
+
+    with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
+        headers = next(csv.reader(f), [])
+
+    rows = 0
+    progress = tqdm(total=read_row_count(input_file), desc="生成总表", unit="条")
+    with ColumnarWriter(output_file, headers + EXTRA_HEADERS) as table, \
+            open(output_file, 'w', encoding='utf-8-sig', newline='') as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(headers + EXTRA_HEADERS)
+        for chunk in pd.read_csv(input_file, encoding='utf-8-sig', dtype=object, keep_default_na=False,
+                                 chunksize=batch_size):
+            columns = simplify_columns([chunk.iloc[:, i].tolist() for i in range(chunk.shape[1])])
+            if index is not None:
+                kept = list(index.filter_new(zip(*columns)))
+                columns = [list(column) for column in zip(*kept)] if kept else [[] for _ in columns]
+            writer.writerows(zip(*columns))
+            table.write_columns(columns)
+            rows += len(columns[0])
+            progress.update(len(chunk))
+    progress.close()
+
+    write_row_count(output_file, rows)
 
-        pbar.close()
 
 if __name__ == "__main__":
     # 测试代码
@@ -0,0 +1,225 @@
+import time
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+
+# 阶段图中的一个阶段：执行func(*args)，depends为须先完成的阶段名；
+# process为True的阶段（CPU密集）在工作进程中执行，func须为模块级函数，args须可pickle
+Stage = namedtuple('Stage', ['name', 'func', 'args', 'depends', 'process'], defaults=[(), (), False])
+
+
+def run_chunk(func, chunk):
+    """在工作进程中依次处理一批任务"""
+    index, items = chunk
+    return index, [func(item) for item in items]
+
+
+def iter_ordered(pool, func, items, chunksize=8, buffer_size=64):
+    """并发处理items，按原顺序逐个输出 (item, 结果)
+
+    任务以chunksize为单位提交到imap_unordered，已提交但尚未按序输出的任务
+    最多buffer_size个，因此内存占用与items总数无关。
+    """
+    slots = threading.Semaphore(buffer_size)
+    stopped = threading.Event()
+
+    def feed():
+        for start in range(0, len(items), chunksize):
+            slots.acquire()
+            if stopped.is_set():
+                return
+            yield start // chunksize, items[start:start + chunksize]
+
+    buffer = {}
+    next_index = 0
+    try:
+        for index, results in pool.imap_unordered(partial(run_chunk, func), feed()):
+            buffer[index] = results
+            while next_index in buffer:
+                start = next_index * chunksize
+                for offset, result in enumerate(buffer.pop(next_index)):
+                    yield items[start + offset], result
+                next_index += 1
+                slots.release()
+    finally:
+        # 提前退出时唤醒可能阻塞在feed中的任务分发线程
+        stopped.set()
+        slots.release(buffer_size)
+
+
+class _Job:
+    """共享进程池中的一个任务（一次iter_ordered调用）"""
+
+    def __init__(self, func, items, chunksize, buffer_size):
+        self.func = func
+        self.items = items
+        self.chunksize = chunksize
+        self.buffer_size = buffer_size
+        self.total_chunks = (len(items) + chunksize - 1) // chunksize
+        self.next_submit = 0
+        self.next_yield = 0
+        self.results = {}
+        self.error = None
+        self.closed = False
+
+    def ready_to_submit(self):
+        return (not self.closed and self.error is None
+                and self.next_submit < self.total_chunks
+                and self.next_submit - self.next_yield < self.buffer_size)
+
+
+class SharedPool:
+    """应用级共享进程池
+
+    所有任务的作业提交到同一个长期存在的进程池，调度线程在各任务之间
+    轮询提交，每次一个作业块，同时在途的作业块总数不超过max_inflight，
+    避免多个任务并发时各自创建进程池导致CPU超额占用。
+    进程池在首次使用时以spawn方式创建：此时应用的其他线程和数据库连接已存在，
+    工作进程不继承父进程的锁和连接。
+    """
+
+    def __init__(self, processes=None, max_inflight=None):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.max_inflight = max_inflight or self.processes * 2
+        self._pool = None
+        self._dispatcher = None
+        self._cond = threading.Condition()
+        self._jobs = []
+        self._turn = 0
+        self._inflight = 0
+        self._closed = False
+
+    def _ensure_started(self):
+        """首次使用时创建进程池和调度线程"""
+        if self._pool is None:
+            self._pool = multiprocessing.get_context('spawn').Pool(processes=self.processes)
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+
+    def _next_job(self):
+        """轮询选择下一个可提交作业块的任务"""
+        for offset in range(len(self._jobs)):
+            job = self._jobs[(self._turn + offset) % len(self._jobs)]
+            if job.ready_to_submit():
+                self._turn = (self._turn + offset + 1) % len(self._jobs)
+                return job
+        return None
+
+    def _dispatch(self):
+        with self._cond:
+            while not self._closed:
+                job = self._next_job() if self._inflight < self.max_inflight else None
+                if job is None:
+                    self._cond.wait()
+                    continue
+
+                index = job.next_submit
+                job.next_submit += 1
+                self._inflight += 1
+                start = index * job.chunksize
+                self._pool.apply_async(
+                    run_chunk,
+                    (job.func, (index, job.items[start:start + job.chunksize])),
+                    callback=partial(self._on_result, job),
+                    error_callback=partial(self._on_error, job)
+                )
+
+    def _on_result(self, job, result):
+        index, results = result
+        with self._cond:
+            self._inflight -= 1
+            if not job.closed:
+                job.results[index] = results
+            self._cond.notify_all()
+
+    def _on_error(self, job, error):
+        with self._cond:
+            self._inflight -= 1
+            job.error = error
+            self._cond.notify_all()
+
+    def iter_ordered(self, func, items, chunksize=8, buffer_size=64):
+        """与iter_ordered相同的接口：在共享进程池中处理items并按原顺序输出"""
+        job = _Job(func, items, chunksize, buffer_size)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("共享进程池已关闭")
+            self._ensure_started()
+            self._jobs.append(job)
+            self._cond.notify_all()
+
+        try:
+            while job.next_yield < job.total_chunks:
+                with self._cond:
+                    while job.next_yield not in job.results and job.error is None:
+                        self._cond.wait()
+                    if job.error is not None:
+                        raise job.error
+                    results = job.results.pop(job.next_yield)
+                    start = job.next_yield * chunksize
+                    job.next_yield += 1
+                    self._cond.notify_all()
+                for offset, result in enumerate(results):
+                    yield items[start + offset], result
+        finally:
+            with self._cond:
+                job.closed = True
+                job.results.clear()
+                self._jobs.remove(job)
+                self._cond.notify_all()
+
+    def close(self):
+        """关闭调度线程和进程池"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+
+
+def run_timed(func, *args):
+    """执行一个阶段，返回 (结果, 耗时)"""
+    start = time.time()
+    return func(*args), time.time() - start
+
+
+def run_graph(stages, workers=None, on_done=None):
+    """按依赖关系执行阶段图：依赖都已完成的阶段立即提交，相互独立的阶段并发执行
+
+    process阶段提交到workers（由调用方创建并长期复用的进程池执行器，应以spawn方式启动：不继承父进程的内存、线程和
+    打开的连接，在线程中调用也安全），只接收文件路径等参数，所需数据由阶段函数自行读取；
+    workers为None时process阶段也在线程中执行。其他阶段（读写文件和SQLite为主）在线程中执行。
+    on_done(阶段名, 结果, 耗时)在调用线程中于每个阶段完成时调用。任一阶段出错时不再提交新的阶段，抛出该异常。
+    返回 {阶段名: 结果}。
+    """
+    stages = {stage.name: stage for stage in stages}
+    results = {}
+    waiting = dict(stages)
+    running = {}
+
+    threads = ThreadPoolExecutor(max_workers=max(len(stages), 1))
+    try:
+        while waiting or running:
+            for name in [name for name, stage in waiting.items() if all(dep in results for dep in stage.depends)]:
+                stage = waiting.pop(name)
+                executor = workers if stage.process and workers is not None else threads
+                running[executor.submit(run_timed, stage.func, *stage.args)] = name
+            if not running:
+                raise ValueError(f"阶段图存在循环依赖：{'、'.join(waiting)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result, elapsed = future.result()
+                results[name] = result
+                if on_done is not None:
+                    on_done(name, result, elapsed)
+    finally:
+        # 出错时取消尚未开始的阶段（已开始的阶段执行完后返回）；进程池由调用方复用，只取消本次提交的阶段
+        for future in running:
+            future.cancel()
+        wait(running)
+        threads.shutdown(cancel_futures=True)
+    return results
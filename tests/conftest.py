@@ -0,0 +1,63 @@
+import random
+import pandas as pd
+import pytest
+
+# 流水总表的列（与processors.pipeline输出一致）
+TOTAL_HEADERS = ['时间', '平台', '检材微信名', '微信号', '对方微信名', '对方微信号', '交易明细', '交易单号', '交易方式']
+
+
+def total_frame(records):
+    """由 (时间, 检材微信名, 对方微信名, 交易明细, 交易方式) 构造流水总表（各列为文本，与读取CSV时一致）"""
+    rows = [[time, '微信', examiner, 'wxid_self', counterpart, 'wxid_other', detail, '<空缺>', tx_type]
+            for time, examiner, counterpart, detail, tx_type in records]
+    return pd.DataFrame(rows, columns=TOTAL_HEADERS, dtype=object)
+
+
+@pytest.fixture
+def make_total():
+    return total_frame
+
+
+# 随机明细的组成片段：覆盖空白、全角逗号、不完整金额、交易单号、交易方式和换行等情况
+DETAIL_TOKENS = ['张三', '（wxid_1）', '（', '）', '2019-11-18 00:56:24', ' ', '  ', '\u3000', '向', '转账', '发送', '红包',
+                 '红姐', '包子', '￥', '3,000', '0.01', '1.234', '元', '，', '[交易单号：123]', '交易单号：456',
+                 '微信转账', '微信红包', 'x', '<空缺>']
+
+
+def random_details(count, seed=0, newline=False):
+    """由DETAIL_TOKENS随机拼接的明细（newline为True时片段中包含换行符）"""
+    rng = random.Random(seed)
+    tokens = DETAIL_TOKENS + ['\n'] if newline else DETAIL_TOKENS
+    return [''.join(rng.choice(tokens) for _ in range(rng.randint(0, 12))) for _ in range(count)]
+
+
+def random_total(count, seed=0):
+    """随机的流水总表记录（交易双方、明细和交易方式均有重复和空值）"""
+    rng = random.Random(seed)
+    names = ['张三', '李四', '红姐', '包子铺', '123', ' ', '']
+    details = [detail.strip() for detail in random_details(count, seed)]
+    return total_frame([
+        (f'2020-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00',
+         rng.choice(names), rng.choice(names), detail or '<空缺>', rng.choice(['微信转账', '微信红包', '<空缺>']))
+        for detail in details
+    ])
+
+
+@pytest.fixture
+def flask_app(tmp_path, monkeypatch):
+    """在临时目录中运行的应用模块（不写入项目的MCP配置）
+
+    共享进程池的工作进程以创建时的当前目录解析相对路径，每个测试使用新的进程池。
+    """
+    pytest.importorskip('flask')
+    monkeypatch.chdir(tmp_path)
+    import app as app_module
+    from importer import config_updater
+    monkeypatch.setattr(config_updater, 'update_mcp_config', lambda report_name: None)
+    monkeypatch.setitem(app_module.app.config, 'WORKER_POOL_PROCESSES', 1)
+    monkeypatch.setattr(app_module, 'shared_pool', None)
+    for folder in ['UPLOAD_FOLDER', 'OUTPUT_FOLDER', 'LOGS_FOLDER', 'DATABASE_FOLDER']:
+        (tmp_path / app_module.app.config[folder]).mkdir(exist_ok=True)
+    yield app_module
+    if app_module.shared_pool is not None:
+        app_module.shared_pool.close()
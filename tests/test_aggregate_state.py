@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+from conftest import random_total
+from analyzers import amount_analyzer, activity_analyzer
+from analyzers.transactions import Transactions
+
+ANALYZERS = [(amount_analyzer, amount_analyzer.AmountState), (activity_analyzer, activity_analyzer.ActivityState)]
+
+
+@pytest.mark.parametrize('analyzer, state_class', ANALYZERS, ids=lambda value: getattr(value, '__name__', ''))
+def test_incremental_merge_matches_full_recompute(tmp_path, analyzer, state_class):
+    frame = random_total(1200, seed=11)
+    batches = [frame.iloc[:500], frame.iloc[500:900], frame.iloc[900:]]
+    state_path = str(tmp_path / state_class.FILE_NAME)
+
+    # 每批在新的连接中合并并提交，与多次增量上传一致
+    for batch in batches:
+        state = state_class(state_path)
+        merged = state.merge(analyzer.aggregate(Transactions(batch.reset_index(drop=True))))
+        state.commit()
+        state.close()
+
+    full = analyzer.aggregate(Transactions(frame))
+    pd.testing.assert_frame_equal(merged, full.reset_index(drop=True), check_dtype=False)
+
+
+def test_uncommitted_merge_is_discarded(tmp_path):
+    frame = random_total(300, seed=12)
+    state_path = str(tmp_path / 'amount_state.db')
+    state = amount_analyzer.AmountState(state_path)
+    committed = state.merge(amount_analyzer.aggregate(Transactions(frame)))
+    state.commit()
+    state.close()
+
+    # 未提交（如导入失败）的合并在关闭时丢弃
+    state = amount_analyzer.AmountState(state_path)
+    state.merge(amount_analyzer.aggregate(Transactions(frame)))
+    state.close()
+    state = amount_analyzer.AmountState(state_path)
+    pd.testing.assert_frame_equal(state.summary(), committed)
+    state.reset()
+    assert state.summary().empty
+    state.close()
@@ -0,0 +1,18 @@
+from analyzers import amount_analyzer
+from analyzers.transactions import Transactions
+
+
+def test_malformed_amount_keeps_parties(make_total):
+    # 金额无法解析（"￥,"）时只将金额记为0，交易双方照常从明细提取
+    transactions = Transactions(make_total([
+        ('2020-01-01 00:00:00', '张三', '李四', '张三 向 李四 转账 ￥,', '微信转账'),
+        ('2020-01-02 00:00:00', '张三', '李四', '张三 向 李四 转账 ￥12.50', '微信转账'),
+    ]))
+    payer, payee, cents = amount_analyzer.extract_parties_and_amount(transactions)
+    assert payer.tolist() == ['张三', '张三']
+    assert payee.tolist() == ['李四', '李四']
+    assert cents.tolist() == [0, 1250]
+
+    summary = amount_analyzer.aggregate(transactions)
+    assert summary.values.tolist() == [['张三', '李四', 1250, 2, 0]]
+
@@ -0,0 +1,65 @@
+import io
+import sqlite3
+import time
+import zipfile
+import pytest
+
+
+@pytest.fixture
+def client(flask_app, monkeypatch):
+    """开启增量导入的应用"""
+    monkeypatch.setitem(flask_app.app.config, 'INCREMENTAL_INGEST', True)
+    return flask_app
+
+
+def report_zip(name, numbers):
+    """只有一个流水记录页面的报告ZIP，numbers为其中的交易序号"""
+    spans = ''.join(f'<span>张三（wxid_a1） 2020-01-01 00:{i // 60:02d}:{i % 60:02d} 张三 向 李四 转账 ￥{i}.00 '
+                    f'交易单号：{1000 + i} 微信转账</span><br/>' for i in numbers)
+    html = (f'<html><body><h4>报告/微信/张三(wxid_a1)/流水记录/李四（wxid_b2）</h4>'
+            f'<div class="c">{spans}</div></body></html>')
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as zf:
+        zf.writestr(f'{name}-files/page1.html', html)
+    data.seek(0)
+    return data
+
+
+def upload(app_module, name, numbers):
+    """上传报告并等待任务结束，返回任务状态"""
+    response = app_module.app.test_client().post(
+        '/upload', data={'file': (report_zip(name, numbers), f'{name}.zip')}, content_type='multipart/form-data')
+    task_id = response.headers['Location'].rsplit('/', 1)[-1]
+    deadline = time.time() + 120
+    while app_module.tasks[task_id]['status'] not in ('completed', 'failed') and time.time() < deadline:
+        time.sleep(0.1)
+    return app_module.tasks[task_id]
+
+
+def imported_ids(name):
+    with sqlite3.connect(f'database/{name}/{name}.db') as conn:
+        return sorted(row[0] for row in conn.execute('SELECT 交易单号 FROM 流水总表'))
+
+
+def ids(numbers):
+    return sorted(str(1000 + i) for i in numbers)
+
+
+def test_overlapping_uploads_of_one_report_import_only_new_transactions(client):
+    assert upload(client, '报告', range(0, 10))['status'] == 'completed'
+    assert imported_ids('报告') == ids(range(0, 10))
+
+    # 同名报告的新导出与上次有5笔重复交易：只导入新增的交易，数据库包含全部历史
+    assert upload(client, '报告', range(5, 15))['status'] == 'completed'
+    assert imported_ids('报告') == ids(range(0, 15))
+
+    task = upload(client, '报告', range(3, 12))
+    assert (task['status'], task['message']) == ('completed', '处理完成：没有新增交易，数据库未变更')
+
+
+def test_index_is_scoped_per_report(client):
+    # 去重索引按报告保存：以其他名称上传的重叠导出是另一个报告，其数据库包含全部交易
+    assert upload(client, '报告A', range(0, 10))['status'] == 'completed'
+    assert upload(client, '报告B', range(5, 15))['status'] == 'completed'
+    assert imported_ids('报告A') == ids(range(0, 10))
+    assert imported_ids('报告B') == ids(range(5, 15))
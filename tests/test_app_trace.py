@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import pytest
+
+
+@pytest.fixture
+def trace_client(flask_app, make_total):
+    """有一个报告数据库（A→B→C）的应用测试客户端"""
+    os.makedirs('database/报告')
+    frame = make_total([
+        ('2020-01-01 10:00:00', 'A', 'B', 'A 向 B 转账 ￥1.00', '微信转账'),
+        ('2020-01-01 11:00:00', 'B', 'C', 'B 向 C 转账 ￥2.00', '微信转账'),
+    ])
+    with sqlite3.connect('database/报告/报告.db') as conn:
+        frame.to_sql('总表', conn, index=False)
+    return flask_app.app.test_client()
+
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_trace_rejects_limit_below_one(trace_client, limit):
+    response = trace_client.get(f'/api/trace/报告?party=A&limit={limit}')
+    assert response.status_code == 400
+    assert 'limit' in response.json['error']
+
+
+def test_trace_limit(trace_client):
+    response = trace_client.get('/api/trace/报告?party=A&limit=1')
+    assert response.status_code == 200
+    assert (response.json['total'], [item['交易方'] for item in response.json['results']]) == (2, ['B'])
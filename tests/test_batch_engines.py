@@ -0,0 +1,57 @@
+import csv
+import random
+import pytest
+from conftest import random_details
+from processors import step2_organize, step4_simplify
+
+NAMES = ['张三', '王 五', 'Tom  Lee', '']
+IDS = ['wxid_a1', '13800001111', '']
+
+
+def write_csv(path, headers, rows):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows)
+
+
+def step1_rows(count, seed=0):
+    """随机的步骤1记录：标题可能无法解析或缺失，内容为以交易方式分隔的多笔交易"""
+    rng = random.Random(seed)
+    details = iter(random_details(count * 4, seed))
+    rows = []
+    for i in range(count):
+        header = (f"报告/{rng.choice(['微信', '微信(分身版)'])}/{rng.choice(NAMES)}({rng.choice(IDS)})/流水记录/"
+                  f"{rng.choice(NAMES)}{rng.choice(['（wxid_c3）', '(12)', ''])}")
+        header = rng.choice([header, header, header, '无法解析的标题', ''])
+        content = rng.choice([' ', '  ', '\r\n ']).join(
+            f"{next(details)} {rng.choice(['2020-01-02 03:04:05', ''])} {next(details)} "
+            f"{rng.choice(['微信转账', '微信红包', '微信转账x'])}" for _ in range(rng.randint(0, 3)))
+        rows.append([f'page{i}.html', header, content])
+    return rows
+
+
+def read_text(path):
+    with open(path, encoding='utf-8-sig') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('batch_size', [7, 1000])
+def test_step2_batch_matches_row_engine(tmp_path, batch_size):
+    input_file = tmp_path / 'step1.csv'
+    write_csv(input_file, ['来源文件', '标题', '原始内容'], step1_rows(300, seed=batch_size))
+    step2_organize.process(str(input_file), str(tmp_path / 'row.csv'), engine='row')
+    step2_organize.process(str(input_file), str(tmp_path / 'batch.csv'), batch_size=batch_size)
+    assert read_text(tmp_path / 'batch.csv') == read_text(tmp_path / 'row.csv')
+
+
+@pytest.mark.parametrize('batch_size', [7, 1000])
+def test_step4_batch_matches_row_engine(tmp_path, batch_size):
+    rng = random.Random(batch_size)
+    rows = [['2020-01-02 03:04:05', '微信', rng.choice(NAMES), rng.choice(IDS), rng.choice(NAMES + [' ']),
+             rng.choice(IDS), detail] for detail in random_details(500, seed=batch_size)]
+    input_file = tmp_path / 'step3.csv'
+    write_csv(input_file, step2_organize.HEADERS, rows)
+    step4_simplify.process(str(input_file), str(tmp_path / 'row.csv'), engine='row')
+    step4_simplify.process(str(input_file), str(tmp_path / 'batch.csv'), batch_size=batch_size)
+    assert read_text(tmp_path / 'batch.csv') == read_text(tmp_path / 'row.csv')
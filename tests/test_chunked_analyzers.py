@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from conftest import random_total
+from analyzers import transfer_analyzer, amount_analyzer, activity_analyzer, flow_analyzer
+from processors import columnar
+
+
+@pytest.mark.parametrize('analyzer', [transfer_analyzer, amount_analyzer, activity_analyzer, flow_analyzer],
+                         ids=lambda analyzer: analyzer.__name__.rsplit('.', 1)[-1])
+def test_chunked_output_matches_whole_file(tmp_path, analyzer):
+    total_file = tmp_path / '流水总表.csv'
+    random_total(2000, seed=5).to_csv(total_file, index=False, encoding='utf-8-sig')
+    assert analyzer.analyze(str(total_file), str(tmp_path / 'whole.csv'))
+    assert analyzer.analyze(str(total_file), str(tmp_path / 'chunked.csv'), chunk_rows=300)
+    whole = (tmp_path / 'whole.csv').read_bytes()
+    assert whole.count(b'\n') > 10
+    assert (tmp_path / 'chunked.csv').read_bytes() == whole
+
+
+def test_read_frame_and_iter_frames_use_same_dtypes(tmp_path):
+    # 微信号全为数字、对方微信名只有前几行为数字：整表和分块读取CSV都应按文本读取
+    total_file = tmp_path / '流水总表.csv'
+    total = random_total(50, seed=7)
+    total['微信号'] = '12345'
+    total.loc[:9, '对方微信名'] = '67890'
+    total.to_csv(total_file, index=False, encoding='utf-8-sig')
+    whole = columnar.read_frame(str(total_file))
+    chunked = pd.concat(list(columnar.iter_frames(str(total_file), 10)), ignore_index=True)
+    pd.testing.assert_frame_equal(chunked, whole)
+    assert (whole.loc[0, '微信号'], whole.loc[0, '对方微信名']) == ('12345', '67890')
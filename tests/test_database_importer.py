@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import pandas as pd
+import pytest
+from importer import database_importer
+from processors.csv_meta import ColumnsWriter, meta_path
+
+
+def table_info(db_path, table_name):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+
+
+def test_chunked_import_has_same_schema(tmp_path, monkeypatch):
+    # 前两行的对方微信名和金额都是数字，分块推断类型时会与整表不同
+    csv_path = tmp_path / '交易总额.csv'
+    pd.DataFrame({'转账方': ['甲', '乙', '丙'], '收款方': ['123', '456', '丁'],
+                  '总金额': ['3000', '12', '0.5'], '微信红包个数': ['0', '1', '2']}).to_csv(
+        csv_path, index=False, encoding='utf-8-sig')
+    monkeypatch.chdir(tmp_path)
+    schemas = []
+    for report_name, chunk_rows in [('整表', None), ('分块', 2)]:
+        assert database_importer.import_tables(report_name, {'交易总额': str(csv_path)}, chunk_rows=chunk_rows)
+        schemas.append(table_info(tmp_path / 'database' / report_name / f'{report_name}.db', '交易总额'))
+    assert schemas[0] == schemas[1]
+    assert [column[2] for column in schemas[0]] == ['TEXT', 'TEXT', 'REAL', 'INTEGER']
+
+
+
+@pytest.mark.parametrize('amounts, amount_type', [(['0.01', '99.9'], 'REAL'), (['0.01', '微信红包'], 'TEXT')])
+def test_unlisted_columns_are_inferred(tmp_path, monkeypatch, amounts, amount_type):
+    # 单笔转账的金额不在COLUMN_DTYPES中，与读取整个CSV时一样推断类型
+    csv_path = tmp_path / '单笔转账.csv'
+    pd.DataFrame({'时间': ['2020-01-01 10:00:00'] * 2, '转账方': ['甲', '乙'], '收款方': ['123', '丙'],
+                  '金额': amounts}).to_csv(csv_path, index=False, encoding='utf-8-sig')
+    monkeypatch.chdir(tmp_path)
+    assert database_importer.import_tables('报告', {'单笔转账': str(csv_path)})
+    schema = table_info(tmp_path / 'database' / '报告' / '报告.db', '单笔转账')
+    assert [column[2] for column in schema] == ['TEXT', 'TEXT', 'TEXT', amount_type]
+
+def test_columns_writer_discards_on_error(tmp_path):
+    csv_path = tmp_path / 'out.csv'
+    with pytest.raises(ValueError):
+        with ColumnsWriter(str(csv_path), ['a', 'b']) as writer:
+            writer.write([['1'], ['2']])
+            raise ValueError
+    assert writer.file.closed
+    assert not csv_path.exists() and not os.path.exists(meta_path(str(csv_path)))
@@ -0,0 +1,37 @@
+from conftest import random_details
+from processors.detail_parser import (parse_parties, parse_transfers, amount_text, amount_texts, to_cents,
+                                      amounts_to_cents, transfer_amount_texts)
+
+
+def test_parse_parties_matches_per_detail():
+    # 明细中含换行符时整列逐条处理，以此作为按行匹配结果的对照
+    details = random_details(5000, seed=1)
+    columns = parse_parties(details)
+    per_detail = parse_parties(details + ['含\n换行'])
+    assert columns == tuple(column[:-1] for column in per_detail)
+
+
+def test_parse_parties_malformed_amount():
+    # 金额无法解析（"￥,"）时金额文本为None、金额记为0，交易双方照常提取
+    payers, payees, texts = parse_parties(['张三 向 李四 转账 ￥,', '张三 向 李四 转账 ￥12.50'])
+    assert (payers, payees, texts) == (['张三', '张三'], ['李四', '李四'], [None, '12.50'])
+    assert amounts_to_cents(texts).tolist() == [0, 1250]
+
+
+def test_amounts_to_cents_matches_to_cents():
+    texts = amount_texts(random_details(5000, seed=4))
+    assert amounts_to_cents(texts).tolist() == [to_cents(text) if text is not None else 0 for text in texts]
+
+
+def test_amount_texts_match_amount_text():
+    details = random_details(5000, seed=2)
+    assert amount_texts(details) == [amount_text(detail) for detail in details]
+
+
+def test_parse_transfers_matches_per_detail():
+    # 明细中含换行符时整列逐条处理，以此作为按行匹配结果的对照
+    details = random_details(5000, seed=3)
+    columns = parse_transfers(details)
+    per_detail = parse_transfers(details + ['含\n换行'])
+    assert columns == tuple(column[:-1] for column in per_detail)
+    assert transfer_amount_texts(details) == per_detail[2][:-1]
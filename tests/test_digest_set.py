@@ -0,0 +1,41 @@
+import os
+import random
+from processors import step3_deduplicate
+from processors.digest_set import DigestSet, digest
+
+
+def test_digest_set_spills_to_sqlite(tmp_path):
+    rng = random.Random(0)
+    keys = [digest(str(rng.randint(0, 50))) for _ in range(300)]
+    expected = set()
+    with DigestSet(spill_threshold=10, spill_dir=str(tmp_path)) as seen:
+        for key in keys:
+            assert seen.add(key) == (key not in expected)
+            expected.add(key)
+        assert seen.spilled
+        assert len(seen) == len(expected)
+        assert not seen.memory
+        path = seen.path
+        assert os.path.exists(path)
+    # 临时文件在关闭时删除
+    assert not os.path.exists(path)
+
+
+def test_digest_set_stays_in_memory_below_threshold(tmp_path):
+    with DigestSet(spill_threshold=10, spill_dir=str(tmp_path)) as seen:
+        for number in range(10):
+            assert seen.add(digest(str(number)))
+        assert not seen.add(digest('0'))
+        assert not seen.spilled
+    assert not os.listdir(tmp_path)
+
+
+def test_deduplicate_output_unchanged_by_spill(tmp_path):
+    rng = random.Random(1)
+    rows = [[f'2020-01-01 00:00:{rng.randint(0, 20):02d}', '微信', '张三', 'wxid_a1', '李四', 'wxid_b2',
+             f'张三（wxid_a1） 2020-01-01 00:00:00 张三 向 李四 转账 ￥{rng.randint(1, 5)}.00'] for _ in range(500)]
+    in_memory = list(step3_deduplicate.deduplicate([list(row) for row in rows]))
+    spilled = list(step3_deduplicate.deduplicate([list(row) for row in rows], spill_threshold=5,
+                                                 spill_dir=str(tmp_path)))
+    assert spilled == in_memory
+    assert 5 < len(in_memory) < len(rows)
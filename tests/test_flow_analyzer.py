@@ -0,0 +1,48 @@
+import csv
+import pandas as pd
+from analyzers import flow_analyzer
+from analyzers.flow_analyzer import FlowGraph
+
+
+def names(graph, nodes):
+    return [graph.names[node] for node in nodes]
+
+
+def test_empty_graph(tmp_path):
+    graph = FlowGraph([], [], [])
+    assert len(graph) == 0 and len(graph.keys) == 0
+    assert graph.out_totals().tolist() == graph.in_degrees().tolist() == []
+    assert [column.tolist() for column in graph.direct_cycles()] == [[], [], [], []]
+    assert graph.cycle_partners().tolist() == []
+    assert flow_analyzer.node_columns(graph) == [[] for _ in flow_analyzer.HEADERS]
+
+    output_file = tmp_path / '资金节点.csv'
+    pairs = pd.DataFrame(columns=['转账方', '收款方', '总金额', '总交易数'])
+    assert flow_analyzer.analyze_summary(pairs, str(output_file))
+    with open(output_file, encoding='utf-8-sig', newline='') as f:
+        assert list(csv.reader(f)) == [flow_analyzer.HEADERS]
+
+
+def test_cycles_and_totals():
+    # A⇄B为往返转账（重复的交易对合并为一条边），A→A自转不计入往返，B→C→A为三角环
+    graph = FlowGraph(['A', 'B', 'A', 'B', 'C', 'A'], ['B', 'A', 'B', 'C', 'A', 'A'],
+                      [100, 50, 25, 10, 5, 1])
+    assert len(graph) == 3 and len(graph.keys) == 5
+    a, b, c = graph.names.tolist().index('A'), graph.names.tolist().index('B'), graph.names.tolist().index('C')
+
+    nodes, cents = graph.successors(a)
+    assert dict(zip(names(graph, nodes), cents.tolist())) == {'A': 1, 'B': 125}
+    assert graph.out_counts()[a] == 3 and graph.in_counts()[a] == 3
+
+    cycle_a, cycle_b, forward, backward = graph.direct_cycles()
+    assert list(zip(names(graph, cycle_a), names(graph, cycle_b), forward.tolist(), backward.tolist())) == \
+        [('A', 'B', 125, 50)]
+    assert graph.cycle_partners().tolist() == [1 if node in (a, b) else 0 for node in range(3)]
+
+    assert [graph.out_totals()[node] for node in (a, b, c)] == [126, 60, 5]
+    assert [graph.in_totals()[node] for node in (a, b, c)] == [56, 125, 10]
+    assert [graph.net_flow()[node] for node in (a, b, c)] == [-70, 65, 5]
+    assert [graph.in_degrees()[node] for node in (a, b, c)] == [3, 1, 1]
+    assert [graph.out_degrees()[node] for node in (a, b, c)] == [2, 2, 1]
+    # 总流量：A 182，B 185，C 15
+    assert names(graph, graph.hub_order()) == ['B', 'A', 'C']
@@ -0,0 +1,56 @@
+from analyzers.fund_tracer import TransferIndex
+
+# A→B→C→D依次转出；B在收到A的转账之前转给E（不计入去向）；D转回A；时间无法解析的转账不计入
+TRANSFERS = [
+    ('2020-01-01 10:00:00', 'A', 'B', 10000),
+    ('2020-01-01 09:00:00', 'B', 'E', 500),
+    ('2020-01-01 11:00:00', 'B', 'C', 8000),
+    ('2020-01-02 00:00:00', 'C', 'D', 6000),
+    ('2020-01-03 00:00:00', 'D', 'A', 1000),
+    ('无法解析', 'A', 'F', 100),
+]
+
+
+def make_index():
+    times, payers, payees, cents = zip(*TRANSFERS)
+    return TransferIndex([None if time == '无法解析' else time for time in times], payers, payees, cents)
+
+
+def reached(found):
+    return [(item['交易方'], item['跳数']) for item in found['results']]
+
+
+def test_trace_follows_time_ordered_hops():
+    found = make_index().trace('A')
+    assert found['total'] == 3
+    assert reached(found) == [('B', 1), ('C', 2), ('D', 3)]
+    assert found['results'][2]['路径'] == [
+        {'时间': '2020-01-01 10:00:00', '转账方': 'A', '收款方': 'B', '金额': '100.0'},
+        {'时间': '2020-01-01 11:00:00', '转账方': 'B', '收款方': 'C', '金额': '80.0'},
+        {'时间': '2020-01-02 00:00:00', '转账方': 'C', '收款方': 'D', '金额': '60.0'},
+    ]
+
+
+def test_trace_hop_limit():
+    index = make_index()
+    assert reached(index.trace('A', hops=2)) == [('B', 1), ('C', 2)]
+    # 跳数限制在 [1, MAX_HOPS]
+    assert reached(index.trace('A', hops=0)) == [('B', 1)]
+    assert reached(index.trace('A', hops=100)) == [('B', 1), ('C', 2), ('D', 3)]
+
+
+def test_trace_time_window():
+    index = make_index()
+    assert reached(index.trace('A', end='2020-01-01 23:59:59')) == [('B', 1), ('C', 2)]
+    assert reached(index.trace('B', start='2020-01-01 08:00:00')) == [('E', 1), ('C', 1), ('D', 2), ('A', 3)]
+    assert reached(index.trace('B', start='2020-01-01 10:00:00')) == [('C', 1), ('D', 2), ('A', 3)]
+    assert index.trace('A', start='2020-01-01 10:00:01')['total'] == 0
+    assert index.trace('A', start='2020-01-02', end='2020-01-01')['total'] == 0
+
+
+def test_trace_limit_and_unknown_source():
+    index = make_index()
+    found = index.trace('A', limit=1)
+    assert (found['total'], reached(found)) == (3, [('B', 1)])
+    assert index.trace('F') == {'source': 'F', 'total': 0, 'results': []}
+    assert index.trace('不存在') == {'source': '不存在', 'total': 0, 'results': []}
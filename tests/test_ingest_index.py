@@ -0,0 +1,40 @@
+import csv
+from processors import step2_organize, step4_simplify
+from processors.ingest_index import IngestIndex, INDEX_FILE_NAME
+
+
+def step3_rows(start, end):
+    return [[f'2020-01-01 00:00:{i:02d}', '微信', '张三', 'wxid_a1', '李四', 'wxid_b2',
+             f'张三 向 李四 转账 ￥{i}.00 交易单号：{1000 + i} 微信转账'] for i in range(start, end)]
+
+
+def upload(tmp_path, name, rows, index):
+    """以rows为步骤3输出生成流水总表，返回输出的交易单号"""
+    input_file = tmp_path / f'{name}_step3.csv'
+    with open(input_file, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(step2_organize.HEADERS)
+        writer.writerows(rows)
+    output_file = tmp_path / f'{name}.csv'
+    step4_simplify.process(str(input_file), str(output_file), index=index)
+    with open(output_file, encoding='utf-8-sig', newline='') as f:
+        return [row[7] for row in csv.reader(f)][1:]
+
+
+def test_overlapping_uploads_only_add_new_transactions(tmp_path):
+    index_path = str(tmp_path / INDEX_FILE_NAME)
+    index = IngestIndex(index_path)
+    assert upload(tmp_path, 'first', step3_rows(0, 10), index) == [str(1000 + i) for i in range(10)]
+    index.commit()
+    index.close()
+
+    # 第二次上传与第一次有5笔重复交易，只输出新增的交易
+    index = IngestIndex(index_path)
+    assert upload(tmp_path, 'second', step3_rows(5, 15), index) == [str(1000 + i) for i in range(10, 15)]
+    assert (index.new, index.existing) == (5, 5)
+    # 未提交（如导入失败）时不记入索引，下次上传重新输出
+    index.close()
+
+    index = IngestIndex(index_path)
+    assert upload(tmp_path, 'retry', step3_rows(5, 15), index) == [str(1000 + i) for i in range(10, 15)]
+    index.close()
@@ -0,0 +1,167 @@
+import zipfile
+import pytest
+from processors import step1_extract
+from processors.worker_pool import SharedPool
+
+
+def page_html(content):
+    return f'<html><body><h3>流水记录</h3><div>{content}</div></body></html>'
+
+
+# 提取引擎对照用的页面：编码声明、嵌套标签、注释和脚本、空白、标题后无div、不含流水记录等
+FIXTURE_PAGES = [
+    page_html('张三 向 李四 转账 ￥1.00'),
+    '<?xml version="1.0" encoding="utf-8"?>\n' + page_html('带编码声明 ￥2.00'),
+    '<?xml version="1.0" encoding="gbk"?>\r\n<html><body><h2>流水记录\r\n  第2页</h2><div>声明 与 内容 不符</div></body></html>',
+    '<!DOCTYPE html><html><head><style>h3 {}</style></head><body>'
+    '<h3><span>流水</span><b>记录</b>  （2020）</h3>'
+    '<div> <p>  第一段 </p><!-- 注释 --><script>var x = 1;</script><p>第二段</p>尾部 </div>'
+    '<h4>流水记录</h4><div><div>嵌套</div>外层</div></body></html>',
+    '<html><body><h1>流水记录<div>标题内的div</div></h1><p>后文</p></body></html>',
+    '<html><body><h3>流水记录</h3><p>没有div</p></body></html>',
+    '<html><body><h3>聊天记录</h3><div>不提取</div></body></html>',
+    '<html><body><h5>流水记录 &amp; &lt;转义&gt;</h5><div>&nbsp;￥3.00&#x3000;元</div></body></html>',
+    '',
+    '   \n  ',
+]
+
+
+def write_report_zip(path, pages):
+    """写入报告ZIP：pages为按页码排列的页面HTML"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for number, html in enumerate(pages, 1):
+            zf.writestr(f'报告-files/page{number}.html', html)
+
+
+def test_shared_pool_reads_rewritten_zip(tmp_path):
+    zip_path = str(tmp_path / '报告.zip')
+    pool = SharedPool(processes=1)
+    try:
+        write_report_zip(zip_path, [page_html('旧记录')])
+        assert list(step1_extract.iter_records(zip_path, pool=pool)) == [['page1.html', '流水记录', '旧记录']]
+
+        # 同名报告重新上传：工作进程中缓存的ZIP句柄须重新打开
+        write_report_zip(zip_path, [page_html('新上传的记录'), page_html('第二页')])
+        assert list(step1_extract.iter_records(zip_path, pool=pool)) == [
+            ['page1.html', '流水记录', '新上传的记录'], ['page2.html', '流水记录', '第二页']]
+    finally:
+        pool.close()
+
+
+@pytest.mark.skipif(step1_extract.etree is None, reason='需要lxml')
+@pytest.mark.parametrize('html', FIXTURE_PAGES)
+def test_lxml_engine_matches_bs4(html):
+    text = step1_extract.decode_page(html.encode('utf-8'))
+    assert step1_extract.extract_with_lxml(text) == step1_extract.extract_with_bs4(text, step1_extract.get_parser())
+
+
+@pytest.mark.skipif(step1_extract.etree is None, reason='需要lxml')
+def test_lxml_engine_writes_identical_csv(tmp_path):
+    zip_path = str(tmp_path / '报告.zip')
+    write_report_zip(zip_path, FIXTURE_PAGES)
+    outputs = []
+    for engine in ['lxml', 'bs4']:
+        output_file = tmp_path / f'{engine}.csv'
+        step1_extract.process(zip_path, str(output_file), engine=engine)
+        outputs.append(output_file.read_bytes())
+    assert outputs[0] == outputs[1]
+
+
+def test_lxml_failure_falls_back_to_bs4(tmp_path, monkeypatch):
+    def fail(text):
+        raise ValueError('无法解析')
+
+    page = tmp_path / 'page1.html'
+    page.write_text(page_html('回退'), encoding='utf-8')
+    monkeypatch.setattr(step1_extract, 'extract_with_lxml', fail)
+    _, records, status = step1_extract.extract_page(str(page), step1_extract.get_parser(), engine='lxml')
+    assert (records, status) == ([['流水记录', '回退']], step1_extract.STATUS_PARSED)
+
+
+def write_pages(directory, pages):
+    """写入页面目录：pages为按页码排列的页面HTML"""
+    directory.mkdir(exist_ok=True)
+    for number, html in enumerate(pages, 1):
+        (directory / f'page{number}.html').write_text(html, encoding='utf-8')
+    return str(directory)
+
+
+def run(input_path, **options):
+    stats = {}
+    return list(step1_extract.iter_records(input_path, stats=stats, **options)), stats
+
+
+def test_page_cache_hits_and_invalidation(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    pages = [page_html('第一页'), page_html('第二页'), '<html><body>没有关键字</body></html>']
+    input_dir = write_pages(tmp_path / 'pages', pages)
+    expected, _ = run(input_dir)
+
+    records, stats = run(input_dir, cache_dir=cache_dir)
+    assert (records, stats['cache_hits']) == (expected, 0)
+    records, stats = run(input_dir, cache_dir=cache_dir)
+    assert (records, stats['cache_hits']) == (expected, 2)
+
+    # 缓存按页面内容索引：修改过的页面重新解析
+    write_pages(tmp_path / 'pages', [page_html('第一页'), page_html('修改后的第二页')])
+    records, stats = run(input_dir, cache_dir=cache_dir)
+    assert stats['cache_hits'] == 1
+    assert records[1] == ['page2.html', '流水记录', '修改后的第二页']
+
+    # 提取规则版本变化后旧缓存全部失效
+    monkeypatch.setattr(step1_extract, 'EXTRACTOR_VERSION', step1_extract.EXTRACTOR_VERSION + 1)
+    records, stats = run(input_dir, cache_dir=cache_dir)
+    assert stats['cache_hits'] == 0
+    records, stats = run(input_dir, cache_dir=cache_dir)
+    assert stats['cache_hits'] == 2
+
+
+def test_zip_pages_match_extracted_directory(tmp_path):
+    # 页码按数字排序，跳过resfile，优先使用 "-files" 目录
+    pages = [page_html(f'第{number}页') for number in range(1, 12)]
+    zip_path = str(tmp_path / '报告.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for number, html in enumerate(pages, 1):
+            zf.writestr(f'报告/报告-files/page{number}.html', html)
+        zf.writestr('报告/报告-files/resfile/page99.html', page_html('资源文件'))
+        zf.writestr('报告/其他/page1.html', page_html('其他目录'))
+    assert step1_extract.can_read_zip(zip_path)
+    assert [page[1] for page in step1_extract.list_pages(zip_path)] == \
+        [f'报告/报告-files/page{number}.html' for number in range(1, 12)]
+
+    zip_output, directory_output = tmp_path / 'zip.csv', tmp_path / 'dir.csv'
+    step1_extract.process(zip_path, str(zip_output))
+    step1_extract.process(write_pages(tmp_path / '报告-files', pages), str(directory_output))
+    assert zip_output.read_bytes() == directory_output.read_bytes()
+
+
+def test_can_read_zip_rejects_unusable_archives(tmp_path):
+    not_zip = tmp_path / 'bad.zip'
+    not_zip.write_bytes(b'not a zip file')
+    no_pages = tmp_path / 'empty.zip'
+    with zipfile.ZipFile(no_pages, 'w') as zf:
+        zf.writestr('报告-files/resfile/page1.html', page_html('资源文件'))
+    assert not step1_extract.can_read_zip(str(not_zip))
+    assert not step1_extract.can_read_zip(str(no_pages))
+
+
+def test_prefilter_skips_pages_without_keyword(tmp_path):
+    pages = [page_html('第一页'), '<html><body><h3>聊天记录</h3><div>无关</div></body></html>', '',
+             page_html('第四页')]
+    input_dir = write_pages(tmp_path / 'pages', pages)
+    records, stats = run(input_dir)
+    unfiltered, unfiltered_stats = run(input_dir, prefilter=False)
+    assert records == unfiltered == [['page1.html', '流水记录', '第一页'], ['page4.html', '流水记录', '第四页']]
+    assert (stats['skipped'], unfiltered_stats['skipped']) == (2, 0)
+
+
+def test_read_page_keyword(tmp_path):
+    page = tmp_path / 'page1.html'
+    page.write_text(page_html('内容'), encoding='utf-8')
+    empty = tmp_path / 'page2.html'
+    empty.write_bytes(b'')
+    keyword = step1_extract.KEYWORD_BYTES
+    assert step1_extract.read_page(str(page), keyword) == page.read_bytes()
+    assert step1_extract.read_page(str(page), '没有'.encode('utf-8')) is None
+    assert step1_extract.read_page(str(empty), keyword) is None
+    assert step1_extract.read_page(str(empty)) == b''
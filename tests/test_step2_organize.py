@@ -0,0 +1,30 @@
+import math
+from processors import step2_organize
+from processors.step2_organize import parse_header
+
+HEADERS = [
+    '报告/微信/张三(wxid_a1)/流水记录/李四（wxid_b2）',
+    '报告/微信(分身版)/王 五(13800001111)/流水记录/ ',
+    '报告/微信/李四(wxid_c3)/流水记录/包子铺（wxid_红）(12)',
+    '报告/微信/没有微信号/流水记录/李四',
+    '聊天记录',
+    '',
+]
+
+
+def test_parse_header_cache_matches_uncached():
+    parse_header.cache_clear()
+    for header in HEADERS * 3 + [None, math.nan]:
+        assert parse_header(header) == parse_header.__wrapped__(header)
+    info = parse_header.cache_info()
+    assert (info.hits, info.misses) == (len(HEADERS) * 2, len(HEADERS) + 2)
+
+
+def test_parse_header_cache_is_bounded():
+    parse_header.cache_clear()
+    for number in range(step2_organize.HEADER_CACHE_SIZE + 100):
+        parse_header(f'报告/微信/张三(wxid_a1)/流水记录/对方{number}（wxid_{number}）')
+    assert parse_header.cache_info().currsize == step2_organize.HEADER_CACHE_SIZE
+    # 被淘汰的标题重新解析，结果不变
+    assert parse_header('报告/微信/张三(wxid_a1)/流水记录/对方0（wxid_0）') == \
+        ('微信', '张三', 'wxid_a1', '对方0', 'wxid_0')
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from conftest import random_total
+from analyzers import transactions as tx
+
+
+@pytest.mark.skipif(tx.pa is None, reason='需要pyarrow')
+def test_saved_parse_results_match_parsing(tmp_path):
+    frame = random_total(1000, seed=7)
+    parsed = tx.Transactions(frame)
+    parsed_file = str(tmp_path / tx.PARSED_FILE_NAME)
+    parsed.save_parsed(parsed_file)
+    loaded = tx.Transactions(frame, tx.read_parsed(parsed_file))
+    for name in ['payers', 'payees', 'amount_texts', 'cents']:
+        expected, actual = getattr(parsed, name), getattr(loaded, name)
+        assert actual.dtype == expected.dtype
+        assert list(actual) == list(expected), name
+    assert np.array_equal(loaded.examiners, parsed.examiners)
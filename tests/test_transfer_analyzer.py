@@ -0,0 +1,22 @@
+from analyzers.transactions import Transactions
+from analyzers.transfer_analyzer import extract_transfers
+
+
+def test_transfer_rules(make_total):
+    # 单笔转账表的收款方不含"红""包"，金额最多两位小数且其后须为"元"、空白或结尾；金额无法解析时双方为<空缺>
+    transactions = Transactions(make_total([
+        ('2020-01-01 00:00:00', '张三', '红姐', '张三 向 红姐 转账 ￥99.90', '微信转账'),
+        ('2020-01-02 00:00:00', '张三', '李四', '张三 向 李四 转账 ￥100.005', '微信转账'),
+        ('2020-01-03 00:00:00', '张三', '李四', '张三 向 李四 转账 ￥3,000元', '微信转账'),
+        ('2020-01-04 00:00:00', '张三', '李四', ' 张三 向 李四 转账 ￥,', '微信转账'),
+        ('2020-01-05 00:00:00', '张三', '红姐', '红姐 发送 红包 ￥5.00', '微信红包'),
+    ]))
+    times, payers, payees, amounts = extract_transfers(transactions)
+    assert times[0] == '2020-01-01 00:00:00'
+    assert list(zip(payers, payees, amounts)) == [
+        ('张三', '<空缺>', '99.9'),
+        ('张三', '李四', '0.0'),
+        ('张三', '李四', '3000.0'),
+        ('<空缺>', '<空缺>', '0.0'),
+        ('红姐', '张三', '微信红包'),
+    ]
@@ -0,0 +1,70 @@
+import operator
+import random
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from processors.worker_pool import iter_ordered, SharedPool
+
+
+class SlowSquare:
+    """随机延时的平方运算，记录已开始处理的任务数"""
+
+    def __init__(self):
+        self.started = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, value):
+        with self.lock:
+            self.started += 1
+        time.sleep(random.random() / 1000)
+        return value * value
+
+
+def test_iter_ordered_keeps_input_order():
+    items = list(range(500))
+    with ThreadPool(8) as pool:
+        assert list(iter_ordered(pool, SlowSquare(), items, chunksize=3, buffer_size=4)) == \
+            [(item, item * item) for item in items]
+
+
+def test_iter_ordered_bounds_pending_chunks():
+    # 输出较慢时，已开始处理但尚未输出的任务不超过buffer_size个作业块
+    func = SlowSquare()
+    items = list(range(300))
+    with ThreadPool(8) as pool:
+        for yielded, _ in enumerate(iter_ordered(pool, func, items, chunksize=5, buffer_size=3)):
+            time.sleep(0.0005)
+            assert func.started - yielded <= 3 * 5
+
+
+def test_iter_ordered_early_exit():
+    with ThreadPool(4) as pool:
+        results = iter_ordered(pool, SlowSquare(), list(range(1000)), chunksize=2, buffer_size=2)
+        assert [next(results) for _ in range(5)] == [(item, item * item) for item in range(5)]
+        results.close()
+        # 提前退出后进程池仍可继续使用
+        assert list(iter_ordered(pool, SlowSquare(), [1, 2, 3])) == [(1, 1), (2, 4), (3, 9)]
+
+
+def test_shared_pool_orders_each_concurrent_job():
+    pool = SharedPool(processes=2, max_inflight=3)
+    jobs = {name: list(range(start, start + 400)) for name, start in [('a', 0), ('b', 10000), ('c', 20000)]}
+    outputs = {}
+
+    def consume(name):
+        outputs[name] = list(pool.iter_ordered(operator.neg, jobs[name], chunksize=7, buffer_size=2))
+
+    try:
+        # 一个任务提前退出，不影响其他任务
+        early = pool.iter_ordered(operator.neg, list(range(1000)), chunksize=5, buffer_size=2)
+        assert next(early) == (0, 0)
+        threads = [threading.Thread(target=consume, args=(name,)) for name in jobs]
+        for thread in threads:
+            thread.start()
+        early.close()
+        for thread in threads:
+            thread.join(timeout=60)
+        assert outputs == {name: [(item, -item) for item in items] for name, items in jobs.items()}
+        assert not pool._jobs
+    finally:
+        pool.close()